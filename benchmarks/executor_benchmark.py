@@ -0,0 +1,157 @@
+"""
+Module Name:    executor_benchmark.py
+Description:    Compares throughput and peak memory of the process and thread executors
+                (utrpy --executor) on a synthetic annotation, skipping the AGAT steps.
+                Each backend runs in a fresh interpreter so that peak memory is measured
+                separately: max RSS of the interpreter and of the largest worker process.
+                For processes the total is bounded by parent + workers x largest worker.
+                Usage: python benchmarks/executor_benchmark.py [-g GENES] [-p PROCESSES] [-r REPEATS]
+Author:         Simon Hegele
+Date:           2026-10-19
+Version:        1.0
+License:        GPL-3
+"""
+
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+def write_annotations(directory: str, genes: int, seqnames=8, seed=0) -> None:
+    """
+    Writes prediction.gff and assembly.gff with multi-exon genes and assembled transcripts.
+    Predicted transcripts reach beyond their exons (like the gene models of ortholog-based
+    predictions with UTRs left out), most assembled transcripts extend the first and last
+    exon into that range and match, the others end inside the last exon and don't.
+    """
+
+    rng = random.Random(seed)
+
+    with (open(os.path.join(directory, "prediction.gff"), "w") as prediction,
+          open(os.path.join(directory, "assembly.gff"), "w") as assembly):
+
+        for s in range(seqnames):
+
+            seqname, position = f"chr{s+1}", 1000
+
+            for g in range(genes // seqnames):
+
+                gene_id = f"{seqname}_g{g}"
+                strand  = rng.choice("+-")
+                exons   = []
+                start   = position
+
+                for _ in range(rng.randint(1, 6)):
+                    length = rng.randint(100, 400)
+                    exons.append((start, start + length))
+                    start += length + rng.randint(200, 800)
+
+                t_start = exons[0][0] - rng.randint(100, 500)
+                t_end   = exons[-1][1] + rng.randint(100, 500)
+
+                prediction.write(f"{seqname}\tpred\tgene\t{t_start}\t{t_end}\t.\t{strand}\t.\tID={gene_id}\n")
+                prediction.write(f"{seqname}\tpred\ttranscript\t{t_start}\t{t_end}\t.\t{strand}\t.\t"
+                                 f"ID={gene_id}.t1;Parent={gene_id}\n")
+                for e, (e_start, e_end) in enumerate(exons):
+                    for feature in ["exon", "CDS"]:
+                        prediction.write(f"{seqname}\tpred\t{feature}\t{e_start}\t{e_end}\t.\t{strand}\t.\t"
+                                         f"ID={gene_id}.t1.{feature}{e};Parent={gene_id}.t1\n")
+
+                for a in range(rng.randint(0, 8)):
+                    a_id    = f"STRG.{seqname}.{g}.{a}"
+                    a_exons = list(exons)
+                    # Assembled transcripts included by the predicted transcript
+                    if rng.random() < 0.75:
+                        a_exons[0]  = (rng.randint(t_start, exons[0][0] - 1), a_exons[0][1])
+                        a_exons[-1] = (a_exons[-1][0], rng.randint(exons[-1][1] + 1, t_end))
+                    else:
+                        a_exons[-1] = (a_exons[-1][0], a_exons[-1][1] - rng.randint(1, 50))
+                    assembly.write(f"{seqname}\tStringTie\ttranscript\t{a_exons[0][0]}\t{a_exons[-1][1]}\t"
+                                   f"1000\t{strand}\t.\tID={a_id}\n")
+                    for e, (e_start, e_end) in enumerate(a_exons):
+                        assembly.write(f"{seqname}\tStringTie\texon\t{e_start}\t{e_end}\t1000\t{strand}\t.\t"
+                                       f"ID={a_id}.exon{e};Parent={a_id}\n")
+
+                position = t_end + rng.randint(1000, 3000)
+
+def run_backend(directory: str, executor: str, processes: int) -> None:
+    """
+    Runs the shards of the annotations in directory with one executor, prints seconds,
+    UTR-variants, shards and the peak RSS of the interpreter and of the largest worker process
+    """
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from utrpy.utrpy_gff_utils  import load_gff, seqname_split
+    from utrpy.utrpy_pipeline   import process_shard, shard_task
+    from utrpy.utrpy_shards     import plan_shards, run_shards, shard_slice
+
+    params = argparse.Namespace(match="all", know_strand=False, keep=None, select="all",
+                                max_exon_length=20000, max_variants=None,
+                                gene_fusions=False)
+
+    p_gff  = load_gff(os.path.join(directory, "prediction.gff"))
+    a_gff  = load_gff(os.path.join(directory, "assembly.gff"))
+    shards = plan_shards(p_gff, a_gff, processes, "all", None)
+    p_gff  = seqname_split(p_gff)
+    a_gff  = seqname_split(a_gff)
+    tasks  = (shard_task(shard_slice(p_gff, shard), shard_slice(a_gff, shard), params, directory, None)
+              for shard in shards.itertuples())
+
+    start    = time.perf_counter()
+    variants = 0
+    for results, _ in run_shards(process_shard, tasks, processes, executor):
+        for frame in results.frames():
+            variants += ((frame["type"] == "transcript") &
+                         frame["attributes"].str.contains("_utr_", regex=False)).sum()
+    seconds  = time.perf_counter() - start
+
+    # ru_maxrss is in KiB on Linux. For children it is the peak of the largest one, not a sum.
+    parent = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    worker = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    print(seconds, variants, len(shards), parent * 1024, worker * 1024)
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of utrpy --executor processes/threads")
+    parser.add_argument("-g", "--genes",     type=int, default=4000)
+    parser.add_argument("-p", "--processes", type=int, default=4)
+    parser.add_argument("-r", "--repeats",   type=int, default=3)
+    parser.add_argument("--run",             nargs=2, help=argparse.SUPPRESS)
+    args   = parser.parse_args()
+
+    if args.run:
+        run_backend(args.run[0], args.run[1], args.processes)
+        return
+
+    gil = sys._is_gil_enabled() if hasattr(sys, "_is_gil_enabled") else True
+    print(f"Python {sys.version.split()[0]} ({'GIL enabled' if gil else 'free-threaded'}), "
+          f"{args.genes} genes, {args.processes} workers")
+    print(f"{'executor':<10} {'shards':>6} {'seconds':>8} {'transcripts/s':>13} {'variants':>8} "
+          f"{'parent RSS':>10} {'worker RSS':>10} {'total RSS':>10}")
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        write_annotations(directory, args.genes)
+
+        for executor in ["processes", "threads"]:
+            for _ in range(args.repeats):
+                result = subprocess.run([sys.executable, __file__, "--run", directory, executor,
+                                         "-p", str(args.processes)],
+                                        check=True, capture_output=True, text=True)
+                seconds, variants, shards, parent, worker = result.stdout.split()
+                # Workers run at once, the total is an upper bound
+                total = int(parent) + (args.processes * int(worker) if executor == "processes" else 0)
+                print(f"{executor:<10} {shards:>6} {float(seconds):>8.2f} "
+                      f"{args.genes / float(seconds):>13.0f} {variants:>8} "
+                      f"{int(parent) / 2**20:>7.0f} MB {int(worker) / 2**20:>7.0f} MB "
+                      f"{'<=' if executor == 'processes' else '  '}{total / 2**20:>5.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -3,42 +3,63 @@ Module Name:    utrpy_agat_prepare
 Description:    Provides method agat_prepare which calls AGAT to fix inconsistencies in
                 the input files and adds missing features that are only implicitly given
                 in the atrributes.
+                GFF3-files passing validation (utrpy_validation) are used without AGAT.
 Author:         Simon Hegele
 Date:           2025-04-01
-Version:        1.0
+Version:        1.2
 License:        GPL-3
 """
 
 import argparse
+import logging
 import os
 import subprocess
 
-def agat_prepare(args: argparse.Namespace) -> None:
+from .utrpy_bgzf       import is_gzip
+from .utrpy_gff_utils  import copy_gff, gff_format
+from .utrpy_validation import is_valid_gff
+
+def agat_convert(file_path: str, output: str, tmpdir: str, threads=1) -> None:
+    """
+    Runs agat_convert_sp_gxf2gxf.pl on a GFF/GTF-file.
+    Compressed files are decompressed into the temporary directory first.
+    """
+
+    file_format = gff_format(file_path)
+
+    if is_gzip(file_path):
+        name, _   = os.path.splitext(os.path.basename(output))
+        plain     = os.path.join(tmpdir, f"{name}_input.{file_format}")
+        copy_gff(file_path, plain, threads)
+        file_path = plain
+
+    subprocess.run(["agat_convert_sp_gxf2gxf.pl",
+                    f"--{file_format}", file_path,
+                    "-o", output],
+                    check=True)
 
-    if args.assembly.endswith(".gtf"):
-        subprocess.run(["agat_convert_sp_gxf2gxf.pl",
-                        "--gtf", args.assembly,
-                        "-o", os.path.join(args.tmpdir, "assembly.gff")],
-                        check=True)
-    if args.assembly.endswith(".gff"):
-        subprocess.run(["agat_convert_sp_gxf2gxf.pl",
-                        "--gff", args.assembly,
-                        "-o", os.path.join(args.tmpdir, "assembly.gff")],
-                        check=True)
-
-    if args.pinky_promise:
-        subprocess.run(["cp",
-                        args.prediction,
-                        os.path.join(args.tmpdir, "prediction.gff")],
-                        check=True)
+def prepare_input(file_path: str, output: str, args: argparse.Namespace, prediction=False) -> None:
+    """
+    Copies valid GFF3-files (and the prediction with --pinky_promise), runs AGAT on the
+    others (and on all GTF-files)
+    """
+
+    if prediction and args.pinky_promise:
+        copy_gff(file_path, output, args.processes)
+    elif (gff_format(file_path) == "gff" and
+          is_valid_gff(file_path, args.cache_dir, args.processes, prediction)):
+        logging.info(f"{file_path} is a valid GFF3-file, skipping AGAT")
+        copy_gff(file_path, output, args.processes)
     else:
-        if args.assembly.endswith(".gtf"):
-            subprocess.run(["agat_convert_sp_gxf2gxf.pl",
-                            "--gtf", args.prediction,
-                            "-o", os.path.join(args.tmpdir, "prediction.gff")],
-                            check=True)
-        if args.assembly.endswith(".gff"):
-            subprocess.run(["agat_convert_sp_gxf2gxf.pl",
-                            "--gff", args.prediction,
-                            "-o", os.path.join(args.tmpdir, "prediction.gff")],
-                            check=True)  
\ No newline at end of file
+        logging.info(f"Preprocessing {file_path} with AGAT")
+        agat_convert(file_path, output, args.tmpdir, args.processes)
+
+def agat_prepare(args: argparse.Namespace) -> None:
+
+    prepare_input(args.assembly,
+                  os.path.join(args.tmpdir, "assembly.gff"),
+                  args)
+    prepare_input(args.prediction,
+                  os.path.join(args.tmpdir, "prediction.gff"),
+                  args,
+                  prediction=True)
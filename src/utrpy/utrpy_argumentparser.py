@@ -1,6 +1,6 @@
 """
 Module Name:    utrpy_argumentparser.py
-Description:    Provides class UTRpyArgparser(ArgumentParser)
+Description:    Provides class UTRpyArgparser(ArgumentParser) and UTRpyShardArgparser(ArgumentParser)
                 - Arguments for UTRpy added on initialization
                 - Extended parse_args() to 
                     a) Check input 
@@ -17,6 +17,10 @@ import datetime
 import logging
 import os
 
+from .utrpy_gff_utils import gff_format
+from .utrpy_memory    import parse_memory
+from .utrpy_regions   import parse_regions
+
 class UTRpyArgparser(argparse.ArgumentParser):
 
     prog        =  "utrpy"
@@ -24,15 +28,15 @@ class UTRpyArgparser(argparse.ArgumentParser):
     description = ("UTR extension of transcript exons from protein orthology based gene "
                    "prediction using exons from reference based assembly")
                        
-    def __init__(self) -> None:
+    def __init__(self, prog=None) -> None:
 
-        super().__init__(prog=self.prog, description=self.description)
+        super().__init__(prog=prog or self.prog, description=self.description)
 
         # Input files
         self.add_argument("prediction",
-                          help="Annotation from gene prediction (GFF/GTF)")
+                          help="Annotation from gene prediction (GFF/GTF, optionally gzip/bgzip compressed)")
         self.add_argument("assembly",
-                          help="Annotation from transcriptome assembly (GFF/GTF)")
+                          help="Annotation from transcriptome assembly (GFF/GTF, optionally gzip/bgzip compressed)")
         self.add_argument("outdir",
                           help="Output directory (Must not exist already)")
         
@@ -52,6 +56,12 @@ class UTRpyArgparser(argparse.ArgumentParser):
                           type=int,
                           default=20000)
         
+        grp1.add_argument("-r","--region",
+                          help="Restrict the run to a region seqname[:start-end] or to the regions "
+                          "of a BED-file, widened to complete genes/transcripts (repeatable)",
+                          metavar="",
+                          action="append")
+        
         grp2 = self.add_argument_group(title="UTR-variant selection",
                                 description="UTR-variant selection")
         grp2.add_argument("-s", "--select",
@@ -59,19 +69,55 @@ class UTRpyArgparser(argparse.ArgumentParser):
                           choices=["shortest", "longest", "all"],
                           default="all",
                           metavar="",)
+        grp2.add_argument("-mv","--max_variants",
+                          help="Maximum number of UTR-variants to keep per transcript "
+                          "[default: 1 for shortest/longest, unlimited for all]",
+                          type=int,
+                          metavar="",
+                          default=None)
         grp2.add_argument("-k","--keep",
                           help="Keep the original transcript instead of deleting them",
                           metavar="",)
 
         grp3 = self.add_argument_group(title="Others")
         grp3.add_argument("-p", "--processes",
-                          help="Number of parallel processes to use [Default:4]",
+                          help="Number of parallel processes (or threads) to use [Default:4]",
                           type=int,
                           metavar="",
                           default=4)
+        grp3.add_argument("-e", "--executor",
+                          help="Run shards in worker processes or in threads sharing the annotations "
+                          "(for free-threaded Python) [choices: processes, threads] [default: processes]",
+                          choices=["processes", "threads"],
+                          metavar="",
+                          default="processes")
+        grp3.add_argument("-mm","--max_memory",
+                          help="Memory budget like 500M or 16G. Limits the size of shards and the "
+                          "number of workers running at once, spills to disk beyond it [default: none]",
+                          type=parse_memory,
+                          metavar="",
+                          default=None)
+        grp3.add_argument("--plan",
+                          help="Only preprocess and parse the input, report the workload and "
+                          "projected memory usage and write the shard layout to utrpy_plan.tsv",
+                          action="store_true",)
         grp3.add_argument("-pp","--pinky_promise",
                           help="The predicted annotation is guaranteed to be well-formated",
                           action="store_true",)
+        grp3.add_argument("-cd","--cache_dir",
+                          help="Directory for cached validation results of input files "
+                          "[default: $XDG_CACHE_HOME/utrpy or ~/.cache/utrpy]",
+                          metavar="",
+                          default=os.path.join(os.environ.get("XDG_CACHE_HOME",
+                                                              os.path.expanduser("~/.cache")),
+                                               "utrpy"))
+        grp3.add_argument("-gf","--gene_fusions",
+                          help="Report assembled transcripts joining exons of multiple predicted "
+                          "genes to utrpy_fusions.gff",
+                          action="store_true",)
+        grp3.add_argument("-gz","--bgzip",
+                          help="Write the output bgzip compressed with a .gzi index",
+                          action="store_true",)
         grp3.add_argument("-tmp","--tmpdir",
                           help="Temporary directory",
                           metavar="",
@@ -89,8 +135,20 @@ class UTRpyArgparser(argparse.ArgumentParser):
             param_file.write(f"assembly     {self.args.assembly:<15}\n")
             param_file.write(f"--match          {self.args.match:<15}\n")
             param_file.write(f"--select         {self.args.select:<15}\n")
+            param_file.write(f"--max_variants   {str(self.args.max_variants):<15}\n")
             param_file.write(f"--know_strand    {self.args.know_strand:<15}\n")
+            for region in self.args.region or []:
+                param_file.write(f"--region         {region:<15}\n")
             param_file.write(f"--processes      {self.args.processes:<15}\n")
+            param_file.write(f"--executor       {self.args.executor:<15}\n")
+            if self.args.max_memory is not None:
+                param_file.write(f"--max_memory     {self.args.max_memory:<15}\n")
+            if self.args.plan:
+                param_file.write("--plan\n")
+            if self.args.gene_fusions:
+                param_file.write("--gene_fusions\n")
+            if self.args.bgzip:
+                param_file.write("--bgzip\n")
             if self.args.pinky_promise:
                 param_file.write("--pinky_promise")
 
@@ -102,13 +160,25 @@ class UTRpyArgparser(argparse.ArgumentParser):
         if not os.path.isfile(self.args.assembly):
             logging.error(f"{self.args.assembly} is not a file")
             exit(1)
+        for file_path in [self.args.prediction, self.args.assembly]:
+            if gff_format(file_path) is None:
+                logging.error(f"{file_path} is neither a GFF- nor a GTF-file (by extension)")
+                exit(1)
+        try:
+            parse_regions(self.args.region or [])
+        except (ValueError, IndexError) as e:
+            logging.error(f"Invalid --region: {e}")
+            exit(1)
+        if self.args.max_variants is not None and self.args.max_variants < 1:
+            logging.error("--max_variants must be at least 1")
+            exit(1)
         if os.path.isdir(self.args.outdir):
             logging.error(f"{self.args.outdir} exists")
             exit(1)
 
-    def parse_args(self):
+    def parse_args(self, args=None):
 
-        self.args = super().parse_args()
+        self.args = super().parse_args(args)
 
         self.check_input()
         os.mkdir(self.args.outdir)
@@ -116,3 +186,27 @@ class UTRpyArgparser(argparse.ArgumentParser):
         self.write_parameter_file()  
         
         return self.args
+
+
+class UTRpyShardArgparser(argparse.ArgumentParser):
+    """
+    Arguments of the commands utrpy run-shard and utrpy merge
+    """
+
+    descriptions = {"run-shard": "Runs the UTR extension for one shard of a manifest from utrpy split",
+                    "merge":     "Merges the shard outputs of a manifest from utrpy split into the "
+                                 "final annotation"}
+
+    def __init__(self, command: str) -> None:
+
+        super().__init__(prog=f"utrpy {command}", description=self.descriptions[command])
+
+        self.add_argument("manifest",
+                          help="Shard manifest written by utrpy split")
+        if command == "run-shard":
+            self.add_argument("shard",
+                              help="Shard ID or number in the manifest")
+        self.add_argument("-l","--log_level",
+                          help="[default: info]",
+                          default="info",
+                          metavar="")
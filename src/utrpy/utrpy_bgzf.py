@@ -0,0 +1,273 @@
+"""
+Module Name:    utrpy_bgzf.py
+Description:    Reading and writing of BGZF (blocked gzip, as written by bgzip) files
+                - BGZF files are concatenations of independent gzip members of at most 64 KiB.
+                  Blocks are (de)compressed on a thread pool (zlib releases the GIL).
+                - BgzfReader(io.RawIOBase)
+                - BgzfWriter(io.RawIOBase)
+                - is_bgzf(file_path: str) -> bool
+                - is_gzip(file_path: str) -> bool
+                - write_gzi(file_path: str) -> None
+Author:         Simon Hegele
+Date:           2026-10-19
+Version:        1.0
+License:        GPL-3
+"""
+
+import collections
+import concurrent.futures
+import io
+import struct
+import typing
+import zlib
+
+# Uncompressed block size used by bgzip, ensures compressed blocks fit into 64 KiB
+BLOCK_SIZE   = 0xff00
+HEADER       = struct.Struct("<4BI2BH2BHH")
+FOOTER       = struct.Struct("<II")
+EOF_BLOCK    = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+def is_gzip(file_path: str) -> bool:
+
+    with open(file_path, "rb") as file:
+        return file.read(2) == b"\x1f\x8b"
+
+def is_bgzf(file_path: str) -> bool:
+    """
+    Checks for the gzip magic number and the BC extra subfield of a BGZF block header
+    """
+
+    with open(file_path, "rb") as file:
+        header = file.read(HEADER.size)
+
+    if len(header) < HEADER.size:
+        return False
+
+    id1, id2, _, flags, _, _, _, _, s1, s2, _, _ = HEADER.unpack(header)
+
+    return (id1, id2) == (0x1f, 0x8b) and bool(flags & 4) and (s1, s2) == (66, 67)
+
+def read_block(file: io.BufferedIOBase) -> bytes | None:
+    """
+    Reads the next raw BGZF block from a binary file, None at the end of the file
+    """
+
+    header = file.read(HEADER.size)
+
+    if not header:
+        return None
+    if len(header) < HEADER.size:
+        raise ValueError("Truncated BGZF block header")
+
+    id1, id2, _, flags, _, _, _, xlen, s1, s2, _, bsize = HEADER.unpack(header)
+
+    if (id1, id2) != (0x1f, 0x8b) or not flags & 4 or (s1, s2) != (66, 67):
+        raise ValueError("Not a BGZF block")
+
+    # Skipping further extra subfields, BSIZE is the total block size minus 1
+    rest = file.read(bsize + 1 - HEADER.size)
+
+    if len(rest) < bsize + 1 - HEADER.size:
+        raise ValueError("Truncated BGZF block")
+
+    return header + rest
+
+def decompress_block(block: bytes) -> bytes:
+
+    xlen         = struct.unpack_from("<H", block, 10)[0]
+    crc, isize   = FOOTER.unpack_from(block, len(block) - FOOTER.size)
+    data         = zlib.decompress(block[12 + xlen:-FOOTER.size], -15)
+
+    if len(data) != isize or zlib.crc32(data) != crc:
+        raise ValueError("Corrupted BGZF block")
+
+    return data
+
+def compress_block(data: bytes, level: int) -> bytes:
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata      = compressor.compress(data) + compressor.flush()
+
+    if len(cdata) + HEADER.size + FOOTER.size > 0x10000:
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+        cdata      = compressor.compress(data) + compressor.flush()
+
+    bsize  = len(cdata) + HEADER.size + FOOTER.size - 1
+    header = HEADER.pack(0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, 66, 67, 2, bsize)
+
+    return header + cdata + FOOTER.pack(zlib.crc32(data), len(data))
+
+class BgzfReader(io.RawIOBase):
+    """
+    Reads the decompressed content of a BGZF file.
+    Blocks are read ahead and decompressed in parallel by a pool of threads.
+    Positions are virtual offsets (compressed block offset << 16 | offset within the block).
+    """
+
+    def __init__(self, file_path: str, threads: int = 1) -> None:
+
+        super().__init__()
+
+        self.file         = open(file_path, "rb")
+        self.threads      = max(1, threads)
+        self.executor     = concurrent.futures.ThreadPoolExecutor(self.threads)
+        self.pending      = collections.deque()
+        self.block        = b""
+        self.block_offset = 0
+        self.position     = 0
+        self.eof          = False
+
+    def readable(self) -> bool:
+
+        return True
+
+    def fill(self) -> None:
+
+        while not self.eof and len(self.pending) < 4 * self.threads:
+            offset = self.file.tell()
+            block  = read_block(self.file)
+            if block is None:
+                self.eof = True
+            else:
+                self.pending.append((offset, self.executor.submit(decompress_block, block)))
+
+    def next_block(self) -> bool:
+
+        self.fill()
+
+        if not self.pending:
+            return False
+
+        self.block_offset, future = self.pending.popleft()
+        self.block, self.position = future.result(), 0
+
+        return True
+
+    def readinto(self, b) -> int:
+
+        while self.position >= len(self.block):
+            if not self.next_block():
+                return 0
+
+        n = min(len(b), len(self.block) - self.position)
+        b[:n] = self.block[self.position:self.position+n]
+        self.position += n
+
+        return n
+
+    def seek_virtual(self, offset: int) -> None:
+
+        for _, future in self.pending:
+            future.cancel()
+
+        self.pending.clear()
+        self.file.seek(offset >> 16)
+        self.eof                  = False
+        self.block, self.position = b"", 0
+        self.next_block()
+        self.position             = offset & 0xffff
+
+    def lines(self) -> typing.Generator:
+        """
+        Yields (virtual offset, line) tuples from the current position on
+        """
+
+        line, offset = b"", None
+
+        while self.position < len(self.block) or self.next_block():
+
+            if offset is None:
+                offset = (self.block_offset << 16) | self.position
+
+            end = self.block.find(b"\n", self.position)
+
+            if end == -1:
+                line         += self.block[self.position:]
+                self.position = len(self.block)
+                continue
+
+            line         += self.block[self.position:end+1]
+            self.position = end + 1
+
+            yield offset, line
+
+            line, offset = b"", None
+
+        if line:
+            yield offset, line
+
+    def close(self) -> None:
+
+        if not self.closed:
+            for _, future in self.pending:
+                future.cancel()
+            self.executor.shutdown()
+            self.file.close()
+        super().close()
+
+class BgzfWriter(io.RawIOBase):
+    """
+    Writes data as BGZF file.
+    Full blocks are compressed in batches by a pool of threads and written in order.
+    """
+
+    def __init__(self, file_path: str, mode="w", threads: int = 1, level: int = 6) -> None:
+
+        super().__init__()
+
+        self.file     = open(file_path, mode.replace("t", "").replace("b", "") + "b")
+        self.threads  = max(1, threads)
+        self.level    = level
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.threads)
+        self.buffer   = bytearray()
+
+    def writable(self) -> bool:
+
+        return True
+
+    def write(self, b) -> int:
+
+        self.buffer += b
+
+        if len(self.buffer) >= 4 * self.threads * BLOCK_SIZE:
+            self.compress(len(self.buffer) - len(self.buffer) % BLOCK_SIZE)
+
+        return len(b)
+
+    def compress(self, n: int) -> None:
+
+        blocks = [bytes(self.buffer[i:min(i+BLOCK_SIZE, n)]) for i in range(0, n, BLOCK_SIZE)]
+
+        for block in self.executor.map(compress_block, blocks, [self.level]*len(blocks)):
+            self.file.write(block)
+
+        del self.buffer[:n]
+
+    def close(self) -> None:
+
+        if not self.closed:
+            self.compress(len(self.buffer))
+            self.file.write(EOF_BLOCK)
+            self.executor.shutdown()
+            self.file.close()
+        super().close()
+
+def write_gzi(file_path: str) -> None:
+    """
+    Writes the bgzip index (<file_path>.gzi) mapping compressed to uncompressed block offsets
+    """
+
+    offsets = []
+
+    with open(file_path, "rb") as file:
+        coffset, uoffset = 0, 0
+        while (block := read_block(file)) is not None:
+            if coffset > 0:
+                offsets.append((coffset, uoffset))
+            coffset += len(block)
+            uoffset += FOOTER.unpack_from(block, len(block) - FOOTER.size)[1]
+
+    with open(f"{file_path}.gzi", "wb") as gzi:
+        gzi.write(struct.pack("<Q", len(offsets)))
+        for coffset, uoffset in offsets:
+            gzi.write(struct.pack("<QQ", coffset, uoffset))
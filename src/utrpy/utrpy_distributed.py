@@ -0,0 +1,162 @@
+"""
+Module Name:    utrpy_distributed.py
+Description:    Multi-node runs in three steps
+                - utrpy split:     Preprocesses the input like utrpy, splits it into shards and
+                                   writes their input slices and a manifest (utrpy_manifest.json)
+                - utrpy run-shard: Runs the UTR extension for one shard of the manifest, e.g. as
+                                   a job of a batch scheduler
+                - utrpy merge:     Merges the shard outputs into the final annotation
+                Paths in the manifest are relative to it, the output directory can be moved.
+                The result is identical to a single-node run with the same parameters
+                (including the gene fusions with --gene_fusions).
+Author:         Simon Hegele
+Date:           2026-10-19
+Version:        1.0
+License:        GPL-3
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+
+from .utrpy_argumentparser import UTRpyArgparser, UTRpyShardArgparser
+from .utrpy_gff_utils      import load_gff, seqname_split, write_gff
+from .utrpy_logging        import logging_setup
+from .utrpy_memory         import RESULTS_SHARE
+from .utrpy_pipeline       import postprocess, preprocess, process_shard, shard_task
+from .utrpy_shards         import plan_shards, shard_slice
+
+MANIFEST = "utrpy_manifest.json"
+
+# Parameters of utrpy split used by run-shard and merge
+shared_args = ["match", "know_strand", "max_exon_length", "select", "max_variants", "keep",
+               "processes", "max_memory", "bgzip", "gene_fusions"]
+
+def load_manifest(file_path: str) -> tuple[dict, argparse.Namespace]:
+
+    with open(file_path) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    args        = argparse.Namespace(**manifest["args"])
+    args.outdir = os.path.dirname(os.path.abspath(file_path))
+
+    return manifest, args
+
+def split(argv: list[str]) -> None:
+
+    args = UTRpyArgparser(prog="utrpy split").parse_args(argv)
+    logging_setup(args)
+
+    p_gff, a_gff = preprocess(args)
+    shards       = plan_shards(p_gff, a_gff, args.processes, args.select, args.max_variants,
+                               args.max_memory, args.executor)
+    p_gff        = seqname_split(p_gff)
+    a_gff        = seqname_split(a_gff)
+    manifest     = {"args": {arg: getattr(args, arg) for arg in shared_args}, "shards": []}
+
+    os.mkdir(os.path.join(args.outdir, "shards"))
+
+    for shard in shards.itertuples():
+
+        shard_id = f"shard_{shard.Index:05d}"
+        paths    = {name: os.path.join("shards", f"{shard_id}.{name}.gff")
+                    for name in ["prediction", "assembly", "utrpy", "fusions"]}
+
+        write_gff(shard_slice(p_gff, shard), os.path.join(args.outdir, paths["prediction"]))
+        write_gff(shard_slice(a_gff, shard), os.path.join(args.outdir, paths["assembly"]))
+
+        manifest["shards"].append({"id":          shard_id,
+                                   "seqname":     shard.seqname,
+                                   "start":       int(shard.start),
+                                   "end":         int(shard.end),
+                                   "transcripts": int(shard.transcripts),
+                                   "pairs":       int(shard.pairs),
+                                   "memory":      int(shard.memory),
+                                   "prediction":  paths["prediction"],
+                                   "assembly":    paths["assembly"],
+                                   "output":      paths["utrpy"],
+                                   "fusions":     paths["fusions"]})
+
+    with open(os.path.join(args.outdir, MANIFEST), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+
+    shutil.rmtree(args.tmpdir)
+
+    logging.info(f"Wrote {len(shards)} shards to {os.path.join(args.outdir, MANIFEST)}")
+
+def run_shard(argv: list[str]) -> None:
+
+    cli            = UTRpyShardArgparser("run-shard").parse_args(argv)
+    manifest, args = load_manifest(cli.manifest)
+    args.log_level = cli.log_level
+    shards         = {shard["id"]: shard for shard in manifest["shards"]}
+
+    if cli.shard.isdigit() and int(cli.shard) < len(manifest["shards"]):
+        shard = manifest["shards"][int(cli.shard)]
+    elif cli.shard in shards:
+        shard = shards[cli.shard]
+    else:
+        logging.error(f"No shard {cli.shard} in {cli.manifest}")
+        exit(1)
+
+    logging_setup(args, os.path.join("shards", f"{shard['id']}.log"))
+    logging.info(f"Running {shard['id']} ({shard['seqname']}:{shard['start']}-{shard['end']})")
+
+    spill_dir   = os.path.join(args.outdir, "shards")
+    spill_limit = None if args.max_memory is None else int(RESULTS_SHARE * args.max_memory)
+    results, fusions = process_shard(
+                        shard_task(load_gff(os.path.join(args.outdir, shard["prediction"])),
+                                   load_gff(os.path.join(args.outdir, shard["assembly"])),
+                                   args,
+                                   spill_dir,
+                                   spill_limit))
+
+    # Writing to temporary files first, outputs only exist once they are complete
+    # (the fusions are written first, merge checks for the output)
+    output = os.path.join(args.outdir, shard["output"])
+    if args.gene_fusions:
+        write_gff(fusions, os.path.join(args.outdir, f"{shard['fusions']}.part"))
+        os.replace(os.path.join(args.outdir, f"{shard['fusions']}.part"),
+                   os.path.join(args.outdir, shard["fusions"]))
+    results.write(f"{output}.part")
+    os.replace(f"{output}.part", output)
+
+def merge(argv: list[str]) -> None:
+
+    cli            = UTRpyShardArgparser("merge").parse_args(argv)
+    manifest, args = load_manifest(cli.manifest)
+    args.log_level = cli.log_level
+
+    logging_setup(args)
+
+    outputs = [os.path.join(args.outdir, shard["output"]) for shard in manifest["shards"]]
+    missing = [output for output in outputs if not os.path.isfile(output)]
+
+    if missing:
+        logging.error(f"{len(missing)} shards have no output yet, e.g. {missing[0]}")
+        exit(1)
+
+    merged = os.path.join(args.outdir, "shards", "utrpy.gff")
+
+    with open(merged, "wb") as merged_file:
+        for output in outputs:
+            with open(output, "rb") as output_file:
+                shutil.copyfileobj(output_file, merged_file)
+
+    if args.gene_fusions:
+        with open(os.path.join(args.outdir, "utrpy_fusions.gff"), "wb") as fusions_file:
+            for shard in manifest["shards"]:
+                with open(os.path.join(args.outdir, shard["fusions"]), "rb") as shard_file:
+                    shutil.copyfileobj(shard_file, fusions_file)
+
+    postprocess(args, merged)
+
+    logging.info("#############################################")
+    logging.info("#    Simon says: Thanks for using UTRpy!    #")
+    logging.info("#############################################")
+
+commands = {"split":     split,
+            "run-shard": run_shard,
+            "merge":     merge}
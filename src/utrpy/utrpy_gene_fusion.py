@@ -0,0 +1,80 @@
+"""
+Module Name:    utrpy_gene_fusion.py
+Description:    Detection of potential gene fusions to guide manual curation: assembled
+                transcripts whose exons match exons of predicted transcripts from two or
+                more different genes. Exons match if they share a splice site (start or end)
+                on compatible strands.
+                - gene_fusions(p_gff, a_gff, know_strand=False) -> pandas.DataFrame
+                  Returns the fusion transcripts and their features from the assembly,
+                  transcripts carry the fused genes in the attribute fused_genes
+                Shards contain complete clusters of overlapping features of both annotations,
+                so fusions are found within a shard.
+Author:         Simon Hegele
+Date:           2026-10-19
+Version:        1.0
+License:        GPL-3
+"""
+
+import logging
+import pandas
+
+from .utrpy_gff_utils  import empty_gff
+from .utrpy_utr_extend import assembled_transcripts, predicted_transcripts
+
+def attribute_column(gff: pandas.DataFrame, key: str) -> pandas.Series:
+
+    return gff["attributes"].str.extract(fr"(?:^|;){key}=([^;]+)")[0]
+
+def exon_genes(p_gff: pandas.DataFrame, p_exons: pandas.DataFrame) -> pandas.Series:
+    """
+    Returns the gene of each predicted exon (exon -> transcript -> gene)
+    """
+
+    p_transcripts = predicted_transcripts(p_gff)
+    genes         = pandas.Series(attribute_column(p_transcripts, "Parent").to_numpy(),
+                                  index=attribute_column(p_transcripts, "ID").to_numpy())
+    genes         = genes[~genes.index.duplicated()]
+
+    return attribute_column(p_exons, "Parent").map(genes)
+
+def gene_fusions(p_gff: pandas.DataFrame,
+                 a_gff: pandas.DataFrame,
+                 know_strand=False) -> pandas.DataFrame:
+    """
+    Exons sharing a splice site overlap, so matching exons are found by joining on the
+    exon starts and ends (hash joins) instead of enumerating all overlapping exons.
+    """
+
+    p_exons = p_gff.loc[p_gff["type"]=="exon"]
+    a_exons = a_gff.loc[a_gff["type"]=="exon"]
+    p_exons = p_exons.assign(gene=exon_genes(p_gff, p_exons))
+    a_exons = a_exons.assign(transcript=attribute_column(a_exons, "Parent"))
+    links   = pandas.concat([p_exons[["seqname", site, "strand", "gene"]]
+                             .merge(a_exons[["seqname", site, "strand", "transcript"]],
+                                    on=["seqname", site],
+                                    suffixes=("_p", "_a"))
+                             for site in ["start", "end"]],
+                            ignore_index=True)
+
+    strand  = links["strand_p"] == links["strand_a"]
+    if not know_strand:
+        strand |= (links["strand_p"] == ".") | (links["strand_a"] == ".")
+
+    links   = links.loc[strand, ["transcript", "gene"]].dropna().drop_duplicates()
+    fused   = links.groupby("transcript", sort=False)["gene"].agg(lambda g: ",".join(sorted(g)))
+    fused   = fused.loc[links.groupby("transcript", sort=False).size() > 1]
+
+    if not len(fused):
+        return empty_gff()
+
+    a_transcripts = assembled_transcripts(a_gff)
+    ids           = attribute_column(a_transcripts, "ID")
+    transcripts   = a_transcripts.loc[ids.isin(fused.index)].copy()
+    transcripts["attributes"] += ";fused_genes=" + ids.loc[transcripts.index].map(fused)
+    features      = a_gff.loc[attribute_column(a_gff, "Parent").isin(fused.index)]
+
+    for transcript, genes in fused.items():
+        logging.info(f"{transcript:<70} Potential fusion of {genes}")
+
+    # Transcripts before their features
+    return pandas.concat([transcripts, features]).sort_values("start", kind="stable")
@@ -6,24 +6,41 @@ Description:    Functions for pandas.Dataframe represented GFF-files
                 - check_strands(feature1: pandas.Series, feature2: pandas.Series, know_strand=False) -> bool
                 - empty_gff() -> pandas.DataFrame
                 - get_ancestor(gff: pandas.DataFrame, feature: pandas.Series, type: str) -> pandas.Series
+                - copy_gff(source: str, target: str, threads=1) -> None
                 - get_descendants(gff: pandas.DataFrame, feature: pandas.Series) -> pandas.DataFrame
                 - features_overlap(feature_1, feature_2) -> bool
-                - load_gff(file_path: str) -> pandas.DataFrame
+                - feature_pair_indices(gff_1: pandas.DataFrame, gff_2: pandas.DataFrame) -> typing.Generator
+                - feature_pairs(gff_1: pandas.DataFrame, gff_2: pandas.DataFrame) -> typing.Generator
+                - gff_format(file_path: str) -> str | None
+                - load_gff(file_path: str, threads=1) -> pandas.DataFrame
+                - open_gff(file_path: str, mode="r", threads=1) -> typing.IO
                 - is_descendant(gff: pandas.DataFrame, feature_1: pandas.Series, feature_2: pandas.Series) -> bool
+                - seqname_bounds(seqnames: numpy.ndarray) -> dict[str, tuple[int, int]]
                 - seqname_split(gff: pandas.DataFrame, seqnames=None) -> dict[str, pandas.DataFrame]
                 - type_split(gff: pandas.DataFrame, type: str) -> typing.Generator
-                - write_gff(gff: pandas.DataFrame, file_path: str) -> None
+                - write_gff(gff: pandas.DataFrame, file_path: str, mode="w", threads=1) -> None
+                Files ending with .gz/.bgz are read and written compressed (BGZF where possible)
                 Functions are alphabetically sorted in this file
 Author:         Simon Hegele
 Date:           2025-04-01
-Version:        1.1
+Version:        1.2
 License:        GPL-3
 """
 
+import bisect
+import gzip
+import io
 import logging
+import numpy
+import os
 import pandas
+import shutil
 import typing
 
+from .utrpy_bgzf import BgzfReader, BgzfWriter, is_bgzf, is_gzip
+
+compressed_extensions = (".gz", ".bgz", ".gzip")
+
 gff_columns = ["seqname",
                "source",
                "type",
@@ -60,6 +77,14 @@ def check_strands(feature1: pandas.Series,
             return True
     return False
 
+def copy_gff(source: str, target: str, threads=1) -> None:
+    """
+    Copies a GFF-file, (de)compressing it if only one of the file names has a compressed extension
+    """
+
+    with open_gff(source, "rb", threads) as src, open_gff(target, "wb", threads) as tgt:
+        shutil.copyfileobj(src, tgt, 1 << 20)
+
 def empty_gff() -> pandas.DataFrame:
     """
     Creates and returns an empty GFF-file
@@ -133,25 +158,87 @@ def features_overlap(feature_1: pandas.Series,
             return True
     return False
 
-def feature_pairs(gff_1: pandas.DataFrame,
-                  gff_2: pandas.DataFrame,
-                  pairing: typing.Callable[[pandas.DataFrame, pandas.Series],pandas.DataFrame],
-                  type="") -> typing.Generator:
-    
-    gff_1_features = gff_1.loc[gff_1["type"].str.contains(type, regex=False)]
-    gff_2_features = gff_2.loc[gff_2["type"].str.contains(type, regex=False)]
+def gff_format(file_path: str) -> str | None:
+    """
+    Returns "gtf" or "gff" depending on the file extension, ignoring compression extensions
+    """
+
+    root, extension = os.path.splitext(file_path.lower())
+
+    if extension in compressed_extensions:
+        root, extension = os.path.splitext(root)
+
+    match extension:
+        case ".gtf":
+            return "gtf"
+        case ".gff" | ".gff3":
+            return "gff"
+
+def feature_pair_indices(gff_1: pandas.DataFrame,
+                         gff_2: pandas.DataFrame) -> typing.Generator:
+    """
+    Yields the index labels of all pairs (feature_1, feature_2) of features from gff_1 and
+    gff_2 where the genomic location of feature_1 includes the genomic location of feature_2.
+    Single sweep over both GFFs sorted by start (per seqname) with an active set of
+    gff_1 features sorted by end: features ending before feature_2 starts are retired,
+    those ending with or after feature_2 are found by bisection. O((n + m) log n + pairs)
+    comparisons instead of one scan of gff_2 per feature of gff_1 (inserting into and
+    retiring from the active list also moves its entries, in C).
+    Both GFFs are sorted by seqname and start once, each seqname is a range of the sorted
+    features (no per-seqname filtering of the whole GFFs).
+    Pairs are yielded in order of the gff_2 features (by seqname and start).
+    """
+
+    features_1 = gff_1.sort_values(["seqname", "start"], kind="stable")
+    features_2 = gff_2.sort_values(["seqname", "start"], kind="stable")
+    labels_1   = features_1.index.tolist()
+    labels_2   = features_2.index.tolist()
+    starts_1   = features_1["start"].tolist()
+    ends_1     = features_1["end"].tolist()
+    starts_2   = features_2["start"].tolist()
+    ends_2     = features_2["end"].tolist()
+    bounds_1   = seqname_bounds(features_1["seqname"].to_numpy())
+
+    for seqname, (first_2, last_2) in seqname_bounds(features_2["seqname"].to_numpy()).items():
+
+        i, last_1 = bounds_1.get(seqname, (0, 0))
+        active    = []
+
+        for j in range(first_2, last_2):
 
-    for i, gff_1_feature in gff_1_features.iterrows():
+            # Activating gff_1 features starting before feature_2
+            while i < last_1 and starts_1[i] <= starts_2[j]:
+                bisect.insort(active, (ends_1[i], i))
+                i += 1
 
-        for j, gff_2_feature in pairing(gff_2_features, gff_1_feature).iterrows():
+            # Retiring gff_1 features ending before feature_2 (and all following ones) start
+            del active[:bisect.bisect_left(active, (starts_2[j], -1))]
 
-            yield gff_1_feature, gff_2_feature
+            for _, k in active[bisect.bisect_left(active, (ends_2[j], -1)):]:
+                yield labels_1[k], labels_2[j]
+
+def feature_pairs(gff_1: pandas.DataFrame,
+                  gff_2: pandas.DataFrame) -> typing.Generator:
+    """
+    Yields all pairs (feature_1, feature_2) of features from gff_1 and gff_2 where the
+    genomic location of feature_1 includes the genomic location of feature_2
+    (see feature_pair_indices)
+    """
+
+    for i, j in feature_pair_indices(gff_1, gff_2):
+
+        yield gff_1.loc[i], gff_2.loc[j]
     
-def load_gff(file_path: str) -> pandas.DataFrame:
+def load_gff(file_path: str, threads=1) -> pandas.DataFrame:
     """
-    Loading a GFF-file from the file-system
+    Loading a (compressed) GFF-file from the file-system
     """
-    return pandas.read_csv(file_path, sep="\t", header=None, comment="#", names=gff_columns)
+    # Columns other than start and end are kept as text, so features are written back unchanged
+    dtypes = {column: str for column in gff_columns if not column in ["start", "end"]}
+
+    with open_gff(file_path, "r", threads) as file:
+        return pandas.read_csv(file, sep="\t", header=None, comment="#", names=gff_columns,
+                               dtype=dtypes)
 
 def included_features(gff: pandas.DataFrame,
                       feature: pandas.Series,
@@ -185,6 +272,30 @@ def is_descendant(gff: pandas.DataFrame,
     
     return feature_2.equals(get_ancestor(gff, feature_1, feature_2["type"]))
 
+def open_gff(file_path: str, mode="r", threads=1) -> typing.IO:
+    """
+    Opens a GFF-file in text (default) or binary mode.
+    - Reading: gzip compression is detected from the content, BGZF is decompressed in parallel
+    - Writing: file names with a compressed extension are written as BGZF
+    """
+
+    binary = "b" in mode
+    mode   = mode.replace("t", "").replace("b", "")
+
+    if mode == "r":
+        if not is_gzip(file_path):
+            return open(file_path, "rb" if binary else "r")
+        if is_bgzf(file_path):
+            stream = io.BufferedReader(BgzfReader(file_path, threads), 1 << 20)
+        else:
+            stream = gzip.open(file_path, "rb")
+    else:
+        if not file_path.lower().endswith(compressed_extensions):
+            return open(file_path, mode + ("b" if binary else ""))
+        stream = io.BufferedWriter(BgzfWriter(file_path, mode, threads), 1 << 20)
+
+    return stream if binary else io.TextIOWrapper(stream)
+
 def overlapping_features(gff: pandas.DataFrame,
                          feature: pandas.Series,
                          type="") -> pandas.DataFrame:
@@ -199,13 +310,25 @@ def overlapping_features(gff: pandas.DataFrame,
 
     return prefiltered[mask_overlap]
 
+def seqname_bounds(seqnames: numpy.ndarray) -> dict[str, tuple[int, int]]:
+    """
+    Returns the range (first, last + 1) of each seqname in an array sorted by seqname
+    """
+
+    first = numpy.flatnonzero(numpy.r_[True, seqnames[1:] != seqnames[:-1]])
+    last  = numpy.r_[first[1:], len(seqnames)]
+
+    return {seqnames[f]: (int(f), int(l)) for f, l in zip(first, last) if f < len(seqnames)}
+
 def seqname_split(gff: pandas.DataFrame,
                   seqnames=None) -> dict[str, pandas.DataFrame]:
 
     if seqnames is None:
         seqnames = gff["seqname"].unique()
 
-    return {seqname: gff.loc[gff["seqname"]==seqname]
+    groups = gff.groupby("seqname", sort=False).indices
+
+    return {seqname: gff.iloc[groups.get(seqname, [])]
             .sort_values("start")
             .reset_index(drop=True)
             for seqname in seqnames}
@@ -216,6 +339,7 @@ def type_split(gff: pandas.DataFrame, type: str) -> typing.Generator:
 
         yield get_descendants(gff, feature)
 
-def write_gff(gff: pandas.DataFrame, file_path: str, mode="w") -> None:
+def write_gff(gff: pandas.DataFrame, file_path: str, mode="w", threads=1) -> None:
 
-    gff.to_csv(file_path, sep="\t", index=False, header=None, mode=mode)
+    with open_gff(file_path, mode, threads) as file:
+        gff.to_csv(file, sep="\t", index=False, header=None)
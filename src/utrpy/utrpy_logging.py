@@ -11,7 +11,7 @@ import logging
 import os
 import sys
 
-def logging_setup(args):
+def logging_setup(args, file_name="utrpy.log"):
 
     match args.log_level:
         case "debug":
@@ -25,7 +25,7 @@ def logging_setup(args):
         case "critical":
             level=logging.CRITICAL
     
-    file_handler   = logging.FileHandler(filename=os.path.join(args.outdir, "utrpy.log"))
+    file_handler   = logging.FileHandler(filename=os.path.join(args.outdir, file_name))
     stdout_handler = logging.StreamHandler(stream=sys.stdout)
 
     logging.basicConfig(level    = level,
@@ -1,58 +1,81 @@
 import logging
-import multiprocessing
-import pandas
 import os
+import pandas
 import shutil
-import subprocess
+import sys
 
-from .utrpy_agat_prepare     import agat_prepare
 from .utrpy_argumentparser   import UTRpyArgparser
-from .utrpy_gff_utils        import load_gff, seqname_split, write_gff
+from .utrpy_distributed      import commands
+from .utrpy_gff_utils        import seqname_split, write_gff
 from .utrpy_logging          import logging_setup
-from .utrpy_utr_extend       import utr_extend_threaded
+from .utrpy_memory           import RESULTS_SHARE, SpillBuffer, spill_frame
+from .utrpy_pipeline         import postprocess, preprocess, process_shard, shard_task
+from .utrpy_shards           import parent_memory, plan_shards, run_shards, shard_slice, worker_count, write_plan
 
 def main():
 
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        commands[sys.argv[1]](sys.argv[2:])
+        return
+
     args = UTRpyArgparser().parse_args()
     logging_setup(args)
 
-    logging.info("Preprocessing with AGAT")
-    agat_prepare(args)
+    p_gff, a_gff = preprocess(args)
 
-    p_gff = load_gff(os.path.join(args.tmpdir, "prediction.gff"))
-    a_gff = load_gff(os.path.join(args.tmpdir, "assembly.gff"))
+    shards  = plan_shards(p_gff, a_gff, args.processes, args.select, args.max_variants,
+                          args.max_memory, args.executor)
+    parent  = parent_memory(p_gff, a_gff, shards, args.max_memory)
+    workers = worker_count(shards, args.processes, args.max_memory, parent)
 
-    match args.match:
-        case "ends":
-            match_middle_exons = False
-        case "all":
-            match_middle_exons = True
+    if args.plan:
+        write_plan(shards, parent, workers, args)
+        shutil.rmtree(args.tmpdir)
+        return
+
+    logging.info(f"Processing {len(shards)} shards with {workers} {args.executor}")
+
+    spill_inputs = (args.max_memory is not None and
+                    parent + workers * shards["memory"].max() > args.max_memory)
 
-    seqnames = list(set(p_gff["seqname"].unique()) &
-                    set(a_gff["seqname"].unique()))
-    
     p_gff = seqname_split(p_gff)
     a_gff = seqname_split(a_gff)
 
-    mp_args = zip([p_gff[s]             for s in seqnames],
-                  [a_gff[s]             for s in seqnames],
-                  [match_middle_exons   for _ in seqnames],
-                  [args.know_strand     for _ in seqnames],
-                  [args.keep            for _ in seqnames],
-                  [args.select          for _ in seqnames],
-                  [args.max_exon_length for _ in seqnames])
-    
-    with multiprocessing.Pool(args.processes) as pool:
-        u_gff = pool.map(utr_extend_threaded, mp_args)
+    if spill_inputs:
+        logging.info("Spilling shards to disk")
+        shard_inputs = [(spill_frame(shard_slice(p_gff, shard), args.tmpdir),
+                         spill_frame(shard_slice(a_gff, shard), args.tmpdir))
+                        for shard in shards.itertuples()]
+        del p_gff, a_gff
+    else:
+        shard_inputs = ((shard_slice(p_gff, shard), shard_slice(a_gff, shard))
+                        for shard in shards.itertuples())
+
+    if args.max_memory is None:
+        results_limit = None
+    else:
+        results_limit = int(RESULTS_SHARE * args.max_memory)
+
+    mp_args = (shard_task(p_shard,
+                          a_shard,
+                          args,
+                          args.tmpdir,
+                          None if results_limit is None else results_limit // workers)
+               for p_shard, a_shard in shard_inputs)
+
+    u_gff   = SpillBuffer(args.tmpdir, results_limit)
+    fusions = []
+
+    for shard_results, shard_fusions in run_shards(process_shard, mp_args, workers, args.executor):
+        u_gff.extend(shard_results)
+        fusions.append(shard_fusions)
 
-    u_gff = pandas.concat(u_gff)
+    if args.gene_fusions:
+        write_gff(pandas.concat(fusions), os.path.join(args.outdir, "utrpy_fusions.gff"))
 
-    write_gff(u_gff, os.path.join(args.tmpdir, "utrpy.gff"))
+    u_gff.write(os.path.join(args.tmpdir, "utrpy.gff"))
 
-    subprocess.run(["agat_convert_sp_gxf2gxf.pl",
-                    "--gff", os.path.join(args.tmpdir, "utrpy.gff"),
-                    "-o", os.path.join(args.outdir, "utrpy.gff")],
-                    check=True)
+    postprocess(args, os.path.join(args.tmpdir, "utrpy.gff"))
     
     shutil.rmtree(args.tmpdir)
 
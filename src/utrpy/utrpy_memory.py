@@ -0,0 +1,141 @@
+"""
+Module Name:    utrpy_memory.py
+Description:    Memory-budgeted execution
+                - parse_memory(memory: str) -> int
+                - peak_memory() -> int
+                - INTERPRETER_MEMORY: footprint of an interpreter with pandas loaded, the base
+                  memory of the main process and of every worker process
+                - SpillBuffer: collects DataFrames in memory up to a limit, beyond that they
+                  are spilled to disk as chunks
+                - spill_frame(frame: pandas.DataFrame, directory: str) -> str
+                - restore_frame(frame: pandas.DataFrame | str) -> pandas.DataFrame
+                Chunks are pickled DataFrames, which keep pandas' column-wise block layout
+                and are read back without parsing.
+Author:         Simon Hegele
+Date:           2026-10-19
+Version:        1.0
+License:        GPL-3
+"""
+
+import os
+import pandas
+import resource
+import sys
+import tempfile
+import typing
+
+from .utrpy_gff_utils import write_gff
+
+# Share of the memory budget for results held in memory (by the main process and by all
+# workers together) before they are spilled to disk
+RESULTS_SHARE = 0.25
+
+units = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+def parse_memory(memory: str) -> int:
+    """
+    Parses a memory size like 500M or 16G (binary units) into bytes
+    """
+
+    memory = memory.strip().upper().removesuffix("B")
+    unit   = memory[-1] if memory and memory[-1] in units else ""
+
+    return int(float(memory.removesuffix(unit)) * units[unit])
+
+def peak_memory() -> int:
+    """
+    Peak resident memory (bytes) of this process so far
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS and in KiB on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# Measured on import, before any annotation is loaded
+INTERPRETER_MEMORY = peak_memory()
+
+def frame_memory(frame: pandas.DataFrame) -> int:
+
+    return int(frame.memory_usage(deep=True).sum())
+
+def spill_frame(frame: pandas.DataFrame, directory: str) -> str:
+
+    file, file_path = tempfile.mkstemp(dir=directory, suffix=".pkl")
+    os.close(file)
+    frame.to_pickle(file_path)
+
+    return file_path
+
+def restore_frame(frame: pandas.DataFrame | str) -> pandas.DataFrame:
+    """
+    Loads (and deletes) a spilled DataFrame, DataFrames are returned as they are
+    """
+
+    if isinstance(frame, pandas.DataFrame):
+        return frame
+
+    restored = pandas.read_pickle(frame)
+    os.remove(frame)
+
+    return restored
+
+class SpillBuffer():
+    """
+    Collects DataFrames in memory. Once they exceed the memory limit (bytes) they are
+    concatenated and spilled to disk as one chunk. Without a limit nothing is spilled.
+    Buffers can be pickled, to be returned from worker processes.
+    """
+
+    def __init__(self, directory: str, limit: int | None = None) -> None:
+
+        self.directory : str                    = directory
+        self.limit     : int | None             = limit
+        self.memory    : int                    = 0
+        self.in_memory : list[pandas.DataFrame] = []
+        self.chunks    : list[str]              = []
+
+    def append(self, frame: pandas.DataFrame) -> None:
+
+        self.in_memory.append(frame)
+
+        if self.limit is not None:
+            self.memory += frame_memory(frame)
+            if self.memory > self.limit:
+                self.spill()
+
+    def spill(self) -> None:
+
+        if self.in_memory:
+            self.chunks.append(spill_frame(pandas.concat(self.in_memory), self.directory))
+            self.in_memory, self.memory = [], 0
+
+    def extend(self, other: "SpillBuffer") -> None:
+
+        # Keeping the order of the frames
+        if other.chunks:
+            self.spill()
+            self.chunks += other.chunks
+
+        for frame in other.in_memory:
+            self.append(frame)
+
+    def frames(self) -> typing.Generator:
+        """
+        Yields the spilled chunks (deleting them) and then the DataFrames in memory
+        """
+
+        for chunk in self.chunks:
+            yield restore_frame(chunk)
+
+        yield from self.in_memory
+
+        self.chunks, self.in_memory, self.memory = [], [], 0
+
+    def write(self, file_path: str, threads=1) -> None:
+
+        with open(file_path, "w"):
+            pass
+
+        for frame in self.frames():
+            write_gff(frame, file_path, "a", threads)
@@ -0,0 +1,103 @@
+"""
+Module Name:    utrpy_pipeline.py
+Description:    Stages of a UTRpy run shared by single-node runs (utrpy) and multi-node runs
+                (utrpy split / run-shard / merge)
+                - preprocess(args) -> tuple[pandas.DataFrame, pandas.DataFrame]
+                - shard_task(p_shard, a_shard, args, spill_dir, spill_limit) -> tuple
+                - process_shard(task: tuple) -> tuple[SpillBuffer, pandas.DataFrame]
+                - postprocess(args, gff_path: str) -> None
+Author:         Simon Hegele
+Date:           2026-10-19
+Version:        1.0
+License:        GPL-3
+"""
+
+import argparse
+import logging
+import os
+import pandas
+import subprocess
+
+from .utrpy_agat_prepare import agat_prepare
+from .utrpy_bgzf         import write_gzi
+from .utrpy_gene_fusion  import gene_fusions
+from .utrpy_gff_utils    import copy_gff, empty_gff, load_gff
+from .utrpy_memory       import SpillBuffer, restore_frame
+from .utrpy_regions      import restrict_to_regions
+from .utrpy_utr_extend   import utr_extend_threaded
+
+def preprocess(args: argparse.Namespace) -> tuple[pandas.DataFrame, pandas.DataFrame]:
+    """
+    Restricts the input to the regions, validates it or preprocesses it with AGAT and loads it
+    """
+
+    if args.region:
+        logging.info("Restricting to regions")
+        restrict_to_regions(args)
+
+    logging.info("Preprocessing")
+    agat_prepare(args)
+
+    return (load_gff(os.path.join(args.tmpdir, "prediction.gff")),
+            load_gff(os.path.join(args.tmpdir, "assembly.gff")))
+
+def shard_task(p_shard: pandas.DataFrame | str,
+               a_shard: pandas.DataFrame | str,
+               args: argparse.Namespace,
+               spill_dir: str,
+               spill_limit: int | None) -> tuple:
+    """
+    Arguments of process_shard for a shard: the arguments of utr_extend_threaded and
+    whether (and how) to detect gene fusions
+    """
+
+    match args.match:
+        case "ends":
+            match_middle_exons = False
+        case "all":
+            match_middle_exons = True
+
+    return ((p_shard,
+             a_shard,
+             match_middle_exons,
+             args.know_strand,
+             args.keep,
+             args.select,
+             args.max_exon_length,
+             args.max_variants,
+             spill_dir,
+             spill_limit),
+            args.gene_fusions,
+            args.know_strand)
+
+def process_shard(task: tuple) -> tuple[SpillBuffer, pandas.DataFrame]:
+    """
+    Detects gene fusions (if requested) and runs the UTR extension on a shard.
+    Fusions are detected first, the UTR extension updates the predicted annotation in place.
+    """
+
+    (p_shard, a_shard, *extend_args), detect_fusions, know_strand = task
+
+    p_shard = restore_frame(p_shard)
+    a_shard = restore_frame(a_shard)
+    fusions = gene_fusions(p_shard, a_shard, know_strand) if detect_fusions else empty_gff()
+
+    return utr_extend_threaded((p_shard, a_shard, *extend_args)), fusions
+
+def postprocess(args: argparse.Namespace, gff_path: str) -> None:
+    """
+    Postprocesses the UTR-extended annotation with AGAT into <outdir>/utrpy.gff(.gz)
+    """
+
+    subprocess.run(["agat_convert_sp_gxf2gxf.pl",
+                    "--gff", gff_path,
+                    "-o", os.path.join(args.outdir, "utrpy.gff")],
+                    check=True)
+
+    if args.bgzip:
+        logging.info("Compressing output")
+        copy_gff(os.path.join(args.outdir, "utrpy.gff"),
+                 os.path.join(args.outdir, "utrpy.gff.gz"),
+                 args.processes)
+        write_gzi(os.path.join(args.outdir, "utrpy.gff.gz"))
+        os.remove(os.path.join(args.outdir, "utrpy.gff"))
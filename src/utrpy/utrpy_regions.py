@@ -0,0 +1,321 @@
+"""
+Module Name:    utrpy_regions.py
+Description:    Region-restricted runs
+                - Regions are given as seqname[:start-end] or as BED-files
+                - CoordinateIndex: tabix-like index of a plain or BGZF compressed GFF/GTF-file
+                  Features are binned into 16 kb windows, each bin holds chunks of file offsets
+                  (virtual offsets for BGZF) of consecutive lines. Stored as <file>.utrpy.idx
+                - Regions are widened to complete genes/transcripts of both annotations
+                - restrict_to_regions(args) replaces the input files by extracts of the regions
+Author:         Simon Hegele
+Date:           2026-10-19
+Version:        1.0
+License:        GPL-3
+"""
+
+import argparse
+import collections
+import gzip
+import json
+import logging
+import os
+import typing
+
+from .utrpy_bgzf      import BgzfReader, is_bgzf, is_gzip
+from .utrpy_gff_utils import copy_gff, gff_format, open_gff
+
+BIN_SHIFT  = 14
+MAX_END    = 2**31 - 1
+
+def parse_region(region: str) -> tuple[str, int, int]:
+    """
+    Parses seqname, seqname:start-end or seqname:start (1-based, inclusive)
+    """
+
+    if not ":" in region:
+        return region, 1, MAX_END
+
+    seqname, coordinates = region.rsplit(":", 1)
+    coordinates          = coordinates.replace(",", "")
+
+    if "-" in coordinates:
+        start, end = coordinates.split("-", 1)
+        start, end = int(start), int(end)
+    else:
+        start, end = int(coordinates), MAX_END
+
+    if not 1 <= start <= end:
+        raise ValueError(f"Invalid region {region}")
+
+    return seqname, start, end
+
+def load_bed(file_path: str) -> list[tuple[str, int, int]]:
+    """
+    Loads regions from a BED-file (0-based, half-open) as 1-based, inclusive regions
+    """
+
+    regions = []
+
+    with open_gff(file_path) as bed:
+        for line in bed:
+            if line.startswith(("#", "track", "browser")) or not line.strip():
+                continue
+            fields = line.rstrip("\n").split("\t")
+            regions.append((fields[0], int(fields[1]) + 1, int(fields[2])))
+
+    return regions
+
+def parse_regions(regions: list[str]) -> list[tuple[str, int, int]]:
+
+    parsed = []
+
+    for region in regions:
+        if os.path.isfile(region):
+            parsed += load_bed(region)
+        else:
+            parsed.append(parse_region(region))
+
+    return parsed
+
+def merge_regions(regions: list[tuple[str, int, int]]) -> list[tuple[str, int, int]]:
+
+    merged = []
+
+    for seqname, start, end in sorted(regions):
+        if merged and merged[-1][0] == seqname and start <= merged[-1][2] + 1:
+            merged[-1] = (seqname, merged[-1][1], max(merged[-1][2], end))
+        else:
+            merged.append((seqname, start, end))
+
+    return merged
+
+def line_reader(file_path: str, offset=0, threads=1) -> typing.Generator:
+    """
+    Yields (offset, line) tuples of a plain or BGZF file from the offset on
+    """
+
+    if is_bgzf(file_path):
+        with BgzfReader(file_path, threads) as reader:
+            reader.seek_virtual(offset)
+            yield from reader.lines()
+    else:
+        with open(file_path, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                yield offset, line
+                offset += len(line)
+
+def parse_line(line: bytes) -> tuple[str, int, int] | None:
+    """
+    Returns seqname, start and end of a feature line, None for other lines
+    """
+
+    if line.startswith(b"#"):
+        return None
+
+    fields = line.split(b"\t", 5)
+
+    if len(fields) < 5:
+        return None
+
+    return fields[0].decode(), int(fields[3]), int(fields[4])
+
+class CoordinateIndex():
+
+    def __init__(self, file_path: str, bins: dict[str, dict[int, list[list[int]]]], threads=1):
+
+        self.file_path = file_path
+        self.bins      = bins
+        self.threads   = threads
+
+    @staticmethod
+    def file_stamp(file_path: str) -> list[int]:
+
+        stat = os.stat(file_path)
+
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @classmethod
+    def build(cls, file_path: str, threads=1) -> "CoordinateIndex":
+
+        bins      = collections.defaultdict(dict)
+        last_line = {}
+
+        for n, (offset, line) in enumerate(line_reader(file_path, threads=threads)):
+
+            if line.startswith(b"##FASTA"):
+                break
+
+            feature = parse_line(line)
+
+            if feature is None:
+                continue
+
+            seqname, start, end = feature
+
+            for b in range(start >> BIN_SHIFT, (end >> BIN_SHIFT) + 1):
+                chunks = bins[seqname].setdefault(b, [])
+                if chunks and last_line[seqname, b] == n - 1:
+                    chunks[-1][1] = offset
+                else:
+                    chunks.append([offset, offset])
+                last_line[seqname, b] = n
+
+        return cls(file_path, dict(bins), threads)
+
+    def save(self, index_path: str) -> None:
+
+        with gzip.open(index_path, "wt") as index:
+            json.dump({"stamp": self.file_stamp(self.file_path),
+                       "bins":  self.bins},
+                      index)
+
+    @classmethod
+    def load(cls, file_path: str, index_path: str, threads=1) -> "CoordinateIndex | None":
+        """
+        Loads an index, None if it does not exist or is outdated
+        """
+
+        if not os.path.isfile(index_path):
+            return None
+
+        with gzip.open(index_path, "rt") as index:
+            content = json.load(index)
+
+        if content["stamp"] != cls.file_stamp(file_path):
+            return None
+
+        bins = {seqname: {int(b): chunks for b, chunks in seqname_bins.items()}
+                for seqname, seqname_bins in content["bins"].items()}
+
+        return cls(file_path, bins, threads)
+
+    def chunks(self, seqname: str, start: int, end: int) -> list[list[int]]:
+        """
+        Returns the merged chunks of all bins overlapping the region
+        """
+
+        chunks = sorted(chunk
+                        for b, bin_chunks in self.bins.get(seqname, {}).items()
+                        if start >> BIN_SHIFT <= b <= end >> BIN_SHIFT
+                        for chunk in bin_chunks)
+        merged = []
+
+        for chunk in chunks:
+            if merged and chunk[0] <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], chunk[1])
+            else:
+                merged.append(list(chunk))
+
+        return merged
+
+    def fetch(self, seqname: str, start: int, end: int) -> typing.Generator:
+        """
+        Yields (offset, start, end, line) tuples of features overlapping the region
+        """
+
+        for chunk_start, chunk_end in self.chunks(seqname, start, end):
+            for offset, line in line_reader(self.file_path, chunk_start, self.threads):
+                if offset > chunk_end:
+                    break
+                feature = parse_line(line)
+                if feature is None:
+                    continue
+                if feature[0] == seqname and feature[1] <= end and feature[2] >= start:
+                    yield offset, feature[1], feature[2], line
+
+    def header(self) -> list[bytes]:
+
+        header = []
+
+        for _, line in line_reader(self.file_path, threads=self.threads):
+            if not line.startswith(b"#"):
+                break
+            header.append(line)
+
+        return header
+
+def get_index(file_path: str, tmpdir: str, threads=1) -> CoordinateIndex:
+    """
+    Loads the index of a file or builds it.
+    Indexes are stored next to the file to be reused by later runs, or in the temporary
+    directory if that is not possible. Plain gzip files can't be accessed randomly and are
+    decompressed into the temporary directory first.
+    """
+
+    if is_gzip(file_path) and not is_bgzf(file_path):
+        logging.warning(f"{file_path} is not bgzip compressed, decompressing it for indexing")
+        plain = os.path.join(tmpdir, f"{os.path.basename(file_path)}.{gff_format(file_path)}")
+        copy_gff(file_path, plain, threads)
+        file_path = plain
+
+    index_path = f"{file_path}.utrpy.idx"
+    index      = CoordinateIndex.load(file_path, index_path, threads)
+
+    if index is None:
+        logging.info(f"Indexing {file_path}")
+        index = CoordinateIndex.build(file_path, threads)
+        if not os.access(os.path.dirname(os.path.abspath(file_path)), os.W_OK):
+            index_path = os.path.join(tmpdir, os.path.basename(index_path))
+        index.save(index_path)
+
+    return index
+
+def widen_regions(indexes: list[CoordinateIndex],
+                  regions: list[tuple[str, int, int]]) -> list[tuple[str, int, int]]:
+    """
+    Widens regions until no feature of any of the files crosses their boundaries,
+    so regions contain complete genes and transcripts
+    """
+
+    widened = []
+
+    for seqname, start, end in merge_regions(regions):
+
+        while True:
+            features     = [(s, e) for index in indexes for _, s, e, _ in index.fetch(seqname, start, end)]
+            wider_start  = min([start] + [s for s, _ in features])
+            wider_end    = max([end]   + [e for _, e in features])
+            if (wider_start, wider_end) == (start, end):
+                break
+            start, end = wider_start, wider_end
+
+        widened.append((seqname, start, end))
+
+    return merge_regions(widened)
+
+def extract_regions(index: CoordinateIndex,
+                    regions: list[tuple[str, int, int]],
+                    file_path: str) -> int:
+    """
+    Writes the header and all lines overlapping the regions in their original order,
+    returns the number of features written
+    """
+
+    lines = {offset: line
+             for region in regions
+             for offset, _, _, line in index.fetch(*region)}
+
+    with open_gff(file_path, "wb") as output:
+        output.writelines(index.header())
+        output.writelines(lines[offset] for offset in sorted(lines))
+
+    return len(lines)
+
+def restrict_to_regions(args: argparse.Namespace) -> None:
+    """
+    Replaces args.prediction and args.assembly by extracts of the (widened) regions
+    """
+
+    indexes = [get_index(args.prediction, args.tmpdir, args.processes),
+               get_index(args.assembly,   args.tmpdir, args.processes)]
+    regions = widen_regions(indexes, parse_regions(args.region))
+
+    for seqname, start, end in regions:
+        logging.info(f"Region {seqname}:{start}-{end}")
+
+    for name, index in zip(["prediction", "assembly"], indexes):
+        file_path = os.path.join(args.tmpdir, f"{name}_regions.{gff_format(getattr(args, name))}")
+        n         = extract_regions(index, regions, file_path)
+        logging.info(f"{n} features of the {name} in regions")
+        setattr(args, name, file_path)
@@ -0,0 +1,349 @@
+"""
+Module Name:    utrpy_shards.py
+Description:    Splitting the annotations into independent shards for parallel processing
+                and estimating the workload of the shards
+                - Clusters: maximal groups of overlapping features of both annotations.
+                  Annotations can be cut between clusters without separating genes,
+                  transcripts or their features.
+                - Shards: consecutive clusters of one seqname, sized by their workload
+                  (predicted transcripts + candidate pairs)
+                - Memory: workers need their shard (WORKER_OVERHEAD times) and, as processes,
+                  an interpreter with pandas loaded. The main process needs an interpreter,
+                  the annotations and their copies split by seqname and the results held in
+                  memory. Its share is subtracted from --max_memory before the rest is
+                  divided among the workers.
+                - plan_shards(p_gff, a_gff, processes, select, max_variants, max_memory, executor) -> pandas.DataFrame
+                - parent_memory(p_gff, a_gff, workload, max_memory) -> int
+                - run_shards(function, tasks, workers, executor) -> typing.Generator
+                - shard_slice(gff: dict[str, pandas.DataFrame], shard) -> pandas.DataFrame
+                - worker_count(shards, processes, max_memory, parent) -> int
+                - write_plan(shards, parent, workers, args) -> None
+Author:         Simon Hegele
+Date:           2026-10-19
+Version:        1.0
+License:        GPL-3
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import logging
+import math
+import numpy
+import os
+import pandas
+import typing
+
+from .utrpy_gff_utils  import empty_gff, feature_pair_indices
+from .utrpy_memory     import INTERPRETER_MEMORY, RESULTS_SHARE, frame_memory
+from .utrpy_utr_extend import assembled_transcripts, predicted_transcripts
+
+SHARDS_PER_PROCESS = 4
+# Workers hold their shard several times (pickled arguments, transcript features, results)
+WORKER_OVERHEAD    = 3
+
+def feature_clusters(p_gff: pandas.DataFrame, a_gff: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Returns the clusters of overlapping features of both annotations (seqname, start, end),
+    seqnames in order of appearance. All seqnames are swept at once: the features are sorted
+    by seqname and start, the reach (maximum end so far) restarts with every seqname.
+    """
+
+    features = pandas.concat([p_gff[["seqname", "start", "end"]],
+                              a_gff[["seqname", "start", "end"]]])
+
+    if not len(features):
+        return pandas.DataFrame({"seqname": [], "start": [], "end": []})
+
+    codes, seqnames = pandas.factorize(features["seqname"])
+    order           = numpy.lexsort((features["start"].to_numpy(), codes))
+    codes           = codes[order]
+    starts          = features["start"].to_numpy()[order]
+    reach           = pandas.Series(features["end"].to_numpy()[order]).groupby(codes).cummax().to_numpy()
+    first           = numpy.flatnonzero(numpy.r_[True, (codes[1:] != codes[:-1]) |
+                                                       (starts[1:] > reach[:-1])])
+    last            = numpy.r_[first[1:] - 1, len(starts) - 1]
+
+    return pandas.DataFrame({"seqname": seqnames.to_numpy()[codes[first]],
+                             "start":   starts[first],
+                             "end":     reach[last]})
+
+def cluster_of(clusters: pandas.DataFrame, gff: pandas.DataFrame) -> pandas.Series:
+    """
+    Returns the index of the cluster of each feature (-1 for features outside the clusters).
+    Clusters are grouped by seqname and sorted by start (see feature_clusters), so a single
+    search on (seqname, start) finds the cluster of every feature.
+    """
+
+    codes, seqnames = pandas.factorize(clusters["seqname"])
+    feature_codes   = seqnames.get_indexer(gff["seqname"])
+    cluster_keys    = (codes.astype(numpy.int64) << 32) + clusters["start"].to_numpy(numpy.int64)
+    feature_keys    = (feature_codes.astype(numpy.int64) << 32) + gff["start"].to_numpy(numpy.int64)
+    positions       = numpy.searchsorted(cluster_keys, feature_keys, side="right") - 1
+    found           = (feature_codes >= 0) & (positions >= 0)
+    found[found]   &= codes[positions[found]] == feature_codes[found]
+    cluster         = numpy.full(len(gff), -1)
+    cluster[found]  = clusters.index.to_numpy()[positions[found]]
+
+    return pandas.Series(cluster, index=gff.index)
+
+def megabytes(n: float) -> str:
+
+    return f"{n / 2**20:.1f} MB"
+
+def bytes_per_row(gff: pandas.DataFrame) -> float:
+
+    return gff.memory_usage(deep=True).sum() / max(1, len(gff))
+
+def transcript_workload(p_gff: pandas.DataFrame,
+                        a_gff: pandas.DataFrame,
+                        select: str,
+                        max_variants: int | None) -> pandas.DataFrame:
+    """
+    Returns candidate pairs and estimated UTR-variant rows per predicted transcript
+    """
+
+    p_transcripts = predicted_transcripts(p_gff)
+    a_transcripts = assembled_transcripts(a_gff)
+
+    pairs    = collections.Counter(i for i, _ in feature_pair_indices(p_transcripts, a_transcripts))
+    pairs    = pandas.Series(pairs, dtype=int).reindex(p_transcripts.index, fill_value=0)
+
+    # UTR-variants consist of about as many features as the predicted transcript, plus one
+    ids      = p_transcripts["attributes"].str.extract(r"(?:^|;)ID=([^;]+)")[0]
+    parents  = p_gff["attributes"].str.extract(r"(?:^|;)Parent=([^;]+)")[0].value_counts()
+    features = ids.map(parents).fillna(0).astype(int)
+
+    if max_variants is None and not select == "all":
+        max_variants = 1
+    variants = pairs if max_variants is None else pairs.clip(upper=max_variants)
+
+    return pandas.DataFrame({"seqname":      p_transcripts["seqname"],
+                             "start":        p_transcripts["start"],
+                             "pairs":        pairs,
+                             "variant_rows": variants * (features + 1)})
+
+def cluster_workload(p_gff: pandas.DataFrame,
+                     a_gff: pandas.DataFrame,
+                     select: str,
+                     max_variants: int | None) -> pandas.DataFrame:
+    """
+    Returns the clusters with their number of predicted transcripts, candidate pairs,
+    estimated UTR-variant rows, rows of both annotations and estimated worker memory (bytes)
+    """
+
+    clusters    = feature_clusters(p_gff, a_gff)
+    transcripts = transcript_workload(p_gff, a_gff, select, max_variants)
+    transcripts["cluster"] = cluster_of(clusters, transcripts)
+
+    per_cluster = transcripts.groupby("cluster").agg(transcripts  = ("pairs", "size"),
+                                                     pairs        = ("pairs", "sum"),
+                                                     variant_rows = ("variant_rows", "sum"))
+    clusters    = clusters.join(per_cluster).fillna(0)
+    clusters["p_rows"] = cluster_of(clusters, p_gff).value_counts()
+    clusters["a_rows"] = cluster_of(clusters, a_gff).value_counts()
+    clusters           = clusters.fillna(0).astype({"transcripts":  int,
+                                                    "pairs":        int,
+                                                    "variant_rows": int,
+                                                    "p_rows":       int,
+                                                    "a_rows":       int})
+
+    p_bytes = bytes_per_row(p_gff)
+    a_bytes = bytes_per_row(a_gff)
+
+    clusters["memory"] = (WORKER_OVERHEAD * (clusters["p_rows"] * p_bytes +
+                                             clusters["a_rows"] * a_bytes) +
+                          clusters["variant_rows"] * p_bytes).astype(int)
+    clusters["cost"]   = clusters["transcripts"] + clusters["pairs"]
+
+    return clusters
+
+def worker_base(executor: str) -> int:
+    """
+    Memory of a worker besides its shard: an interpreter for processes, none for threads
+    """
+
+    return INTERPRETER_MEMORY if executor == "processes" else 0
+
+def parent_memory(p_gff: pandas.DataFrame,
+                  a_gff: pandas.DataFrame,
+                  workload: pandas.DataFrame,
+                  max_memory: int | None) -> int:
+    """
+    Estimated peak memory of the main process (bytes): the interpreter, the annotations and
+    their copies split by seqname and the results held in memory (at most RESULTS_SHARE of
+    the budget). workload has the estimated variant rows of the clusters or shards.
+    """
+
+    results = (len(p_gff) + workload["variant_rows"].sum()) * bytes_per_row(p_gff)
+    if max_memory is not None:
+        results = min(results, RESULTS_SHARE * max_memory)
+
+    return int(INTERPRETER_MEMORY + 2 * (frame_memory(p_gff) + frame_memory(a_gff)) + results)
+
+def plan_shards(p_gff: pandas.DataFrame,
+                a_gff: pandas.DataFrame,
+                processes: int,
+                select: str,
+                max_variants: int | None,
+                max_memory: int | None = None,
+                executor="processes") -> pandas.DataFrame:
+    """
+    Groups consecutive clusters of each seqname into shards of similar workload.
+    About SHARDS_PER_PROCESS shards per process are created to balance the load.
+    With a memory budget, shards are also cut before they exceed the budget of a worker:
+    what remains of the budget after the main process, divided among the workers that fit
+    with the largest cluster. Shards aren't cut below the largest cluster.
+    The memory of the shards includes the base memory of a worker.
+    Clusters without predicted features are left out.
+    """
+
+    clusters = cluster_workload(p_gff, a_gff, select, max_variants)
+    clusters = clusters.loc[clusters["p_rows"] > 0]
+    base     = worker_base(executor)
+    target   = max(1, math.ceil(clusters["cost"].sum() / (processes * SHARDS_PER_PROCESS)))
+    if max_memory is None or not len(clusters):
+        budget = math.inf
+    else:
+        largest   = clusters["memory"].max()
+        available = max_memory - parent_memory(p_gff, a_gff, clusters, max_memory)
+        workers   = max(1, min(processes, int(available // (largest + base))))
+        budget    = max(largest, available / workers - base)
+    shard    = []
+    n        = -1
+    seqname  = None
+    cost     = memory = 0
+
+    for cluster in clusters.itertuples():
+        if (cluster.seqname != seqname or
+            cost + cluster.cost > target or
+            memory + cluster.memory > budget):
+            n, cost, memory, seqname = n + 1, 0, 0, cluster.seqname
+        cost   += cluster.cost
+        memory += cluster.memory
+        shard.append(n)
+
+    clusters = clusters.assign(shard=shard)
+    shards   = clusters.groupby("shard").agg(seqname          = ("seqname", "first"),
+                                             start            = ("start", "min"),
+                                             end              = ("end", "max"),
+                                             clusters         = ("cost", "size"),
+                                             transcripts      = ("transcripts", "sum"),
+                                             pairs            = ("pairs", "sum"),
+                                             variant_rows     = ("variant_rows", "sum"),
+                                             p_rows           = ("p_rows", "sum"),
+                                             a_rows           = ("a_rows", "sum"),
+                                             memory           = ("memory", "sum"),
+                                             cost             = ("cost", "sum"),
+                                             max_cluster_cost = ("cost", "max"))
+    shards["memory"] += base
+
+    return shards
+
+def worker_count(shards: pandas.DataFrame,
+                 processes: int,
+                 max_memory: int | None,
+                 parent: int = 0) -> int:
+    """
+    Number of workers to run at once without exceeding the memory budget with the largest shards.
+    parent is the memory of the main process, the workers share the rest of the budget.
+    """
+
+    if max_memory is None or not len(shards):
+        return processes
+
+    largest = max(1, shards["memory"].max())
+    workers = int(max(0, max_memory - parent) // largest)
+
+    if workers == 0:
+        logging.warning(f"--max_memory {megabytes(max_memory)} does not fit a single worker: "
+                        f"the main process is estimated to need {megabytes(parent)}, "
+                        f"a worker with the largest shard {megabytes(largest)}. "
+                        f"Running 1 worker, memory will exceed --max_memory")
+
+    return max(1, min(processes, workers))
+
+def run_shards(function: typing.Callable,
+               tasks: typing.Iterable,
+               workers: int,
+               executor="processes") -> typing.Generator:
+    """
+    Runs function on the tasks with a pool of worker processes or threads, yielding the
+    results in order. At most two tasks per worker are submitted at once, so tasks can be
+    created lazily and results don't pile up.
+    Threads receive their shards without pickling. Each task holds its own copy of its
+    shard (see shard_slice), tasks don't write to shared data. Threads only run in parallel
+    on free-threaded (no-GIL) builds, which has not been benchmarked yet.
+    """
+
+    match executor:
+        case "processes":
+            pool = concurrent.futures.ProcessPoolExecutor(workers)
+        case "threads":
+            pool = concurrent.futures.ThreadPoolExecutor(workers)
+
+    with pool:
+
+        pending = collections.deque()
+
+        for task in tasks:
+            pending.append(pool.submit(function, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+def shard_slice(gff: dict[str, pandas.DataFrame], shard) -> pandas.DataFrame:
+    """
+    Returns the features of a shard from an annotation split with seqname_split.
+    The slice is copied explicitly: tasks update their shard in place (gene lengths), lazy
+    copy-on-write slices would share blocks and reference tracking across threads.
+    """
+
+    features = gff.get(shard.seqname, empty_gff())
+    first    = features["start"].searchsorted(shard.start, side="left")
+    last     = features["start"].searchsorted(shard.end,   side="right")
+
+    return features.iloc[first:last].reset_index(drop=True).copy()
+
+def write_plan(shards: pandas.DataFrame,
+               parent: int,
+               workers: int,
+               args: argparse.Namespace) -> None:
+    """
+    Reports the workload per seqname and the projected memory usage of the main process
+    (parent, see parent_memory) and the workers, writes the shard layout to
+    <outdir>/utrpy_plan.tsv
+    """
+
+    seqnames = shards.groupby("seqname").agg(shards       = ("cost", "size"),
+                                             transcripts  = ("transcripts", "sum"),
+                                             pairs        = ("pairs", "sum"),
+                                             variant_rows = ("variant_rows", "sum"),
+                                             max_memory   = ("memory", "max"))
+    seqnames["max_memory"] = seqnames["max_memory"].map(megabytes)
+
+    # The shards are cut for --processes, the suggestion is bounded by the largest cluster
+    total_cost = shards["cost"].sum()
+    max_cost   = max(1, shards["max_cluster_cost"].max()) if len(shards) else 1
+    worker     = shards["memory"].max() if len(shards) else 0
+    suggested  = int(max(1, min(os.cpu_count() or 1, shards["clusters"].sum(),
+                                total_cost // max_cost)))
+
+    logging.info(f"Workload per seqname:\n{seqnames.to_string()}")
+    logging.info(f"Shards:                   {len(shards)}")
+    logging.info(f"Predicted transcripts:    {shards['transcripts'].sum()}")
+    logging.info(f"Candidate pairs:          {shards['pairs'].sum()}")
+    logging.info(f"Estimated variant rows:   {shards['variant_rows'].sum()}")
+    logging.info(f"Peak memory per worker:   {megabytes(worker)}")
+    logging.info(f"Peak memory main process: {megabytes(parent)}")
+    logging.info(f"Projected peak memory:    {megabytes(parent + workers * worker)} "
+                 f"({workers} workers)")
+    logging.info(f"Suggested --processes:    {suggested} "
+                 f"(the largest cluster takes {max_cost / max(1, total_cost):.1%} of the work)")
+    if args.max_memory is not None:
+        logging.info(f"Memory budget:            {megabytes(args.max_memory)} "
+                     f"(inputs and results beyond it are spilled to disk)")
+
+    shards.to_csv(os.path.join(args.outdir, "utrpy_plan.tsv"), sep="\t")
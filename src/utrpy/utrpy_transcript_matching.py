@@ -12,7 +12,7 @@ import pandas
 import typing
 import logging
 
-from .utrpy_gff_utils  import check_strands, included_features
+from .utrpy_gff_utils  import check_strands
 from .utrpy_transcript import Transcript
 
 def first_matching_exon(p_transcript: Transcript,
@@ -105,28 +105,26 @@ def check_exon_lengths(transcript: Transcript, max_exon_length) -> bool:
 
     return max_exon_length > exon_lenghts.max()
  
-def transcript_matches(p_transcript: Transcript,
+def transcript_matches(p_transcript: pandas.Series,
+                       a_transcripts: list[pandas.Series],
                        p_gff: pandas.DataFrame,
                        a_gff: pandas.DataFrame,
                        know_strand: bool,
                        match_middle_exons: bool,
                        max_exon_length: int) -> typing.Generator:
-    
-    a_transcripts = pandas.concat([included_features(a_gff, p_transcript, "RNA"),
-                                   included_features(a_gff, p_transcript, "transcript")])
+    """
+    Matches a predicted transcript against its candidates, the assembled transcripts
+    included by it (see feature_pairs)
+    """
 
-    a_transcripts = a_transcripts[
-        a_transcripts.apply(lambda t: check_strands(t,
-                                                    p_transcript,
-                                                    know_strand),
-                            axis=1)]
+    a_transcripts = [t for t in a_transcripts if check_strands(t, p_transcript, know_strand)]
     
     p_transcript = Transcript(p_transcript, p_gff)
 
     if len(p_transcript.exons) == 0:
         return
 
-    for i, a_transcript in a_transcripts.iterrows():
+    for a_transcript in a_transcripts:
 
         a_transcript = Transcript(a_transcript, a_gff)
 
@@ -1,26 +1,49 @@
+import collections
+import heapq
+import itertools
 import logging
 import pandas
-import numpy
+import typing
 
-from .utrpy_gff_utils           import attributes_dict
+from .utrpy_gff_utils           import attributes_dict, feature_pairs
+from .utrpy_memory              import SpillBuffer, restore_frame
 from .utrpy_transcript          import Transcript
 from .utrpy_transcript_matching import transcript_matches
-from .utrpy_utr_variant         import utr_variant
+from .utrpy_utr_variant         import utr_variant, variant_length
 
-def select_from_variants(variants: list[dict], select: str):
+def select_from_matches(matches: typing.Iterable[dict],
+                        select: str,
+                        max_variants: int | None) -> list[tuple[int, dict]]:
+    """
+    Selects the transcript matches to build UTR-variants from.
+    Matches are consumed as a stream and ranked by variant_length on a heap bounded by
+    max_variants, so only the selected matches are turned into UTR-variants.
+    Returns (variant number, match) tuples in the order the matches were found.
+    """
+
+    matches = enumerate(matches)
 
-    if select == "all":
-        return variants
-    
-    exons   = [v["transcript"].loc[v["type"]=="exon"] for v in variants]
-    lengths = [numpy.sum(e["end"]-e["start"]-1) for e in exons]
-        
     match select:
+        case "all":
+            selected = list(itertools.islice(matches, max_variants))
         case "shortest":
-            return [variants[lengths.index(numpy.min(lengths))]]
+            selected = heapq.nsmallest(max_variants or 1, matches,
+                                       key=lambda m: variant_length(m[1]))
         case "longest":
-            return [variants[lengths.index(numpy.max(lengths))]]
+            selected = heapq.nlargest(max_variants or 1, matches,
+                                      key=lambda m: variant_length(m[1]))
+
+    return sorted(selected, key=lambda m: m[0])
         
+def predicted_transcripts(p_gff: pandas.DataFrame) -> pandas.DataFrame:
+
+    return p_gff.loc[p_gff["type"]=="transcript"]
+
+def assembled_transcripts(a_gff: pandas.DataFrame) -> pandas.DataFrame:
+
+    return a_gff.loc[a_gff["type"].str.contains("RNA", regex=False) |
+                     a_gff["type"].str.contains("transcript", regex=False)]
+
 def update_gene_lengths(utr_variants: list, p_gff: pandas.DataFrame):
 
     for variant in utr_variants:
@@ -37,54 +60,96 @@ def delete_original_transcripts(p_gff: pandas.DataFrame,
 
     return p_gff
     
-def utr_extend(p_gff: pandas.DataFrame,
-               a_gff: pandas.DataFrame,
-               know_strand: bool,
-               match_middle_exons: bool,
-               keep: bool,
-               select: str,
-               max_exon_length: int) -> pandas.DataFrame:
+def utr_extend_frames(p_gff: pandas.DataFrame,
+                      a_gff: pandas.DataFrame,
+                      know_strand: bool,
+                      match_middle_exons: bool,
+                      keep: bool,
+                      select: str,
+                      max_exon_length: int,
+                      max_variants: int | None = None) -> typing.Generator:
+    """
+    Yields the UTR-variants as soon as they are created, followed by the predicted
+    annotation with updated gene lengths (and without the replaced transcripts)
+    """
     
-    p_transcripts    = p_gff.loc[p_gff["type"]=="transcript"]
-    all_utr_variants = []
+    p_transcripts    = predicted_transcripts(p_gff)
+    a_transcripts    = assembled_transcripts(a_gff)
+    candidates       = collections.defaultdict(list)
     to_delete        = []
 
+    for p_transcript, a_transcript in feature_pairs(p_transcripts, a_transcripts):
+        candidates[p_transcript.name].append(a_transcript)
+
     for i, p_transcript in p_transcripts.iterrows():
 
         transcript_id = attributes_dict(p_transcript)["ID"]
 
-        matches = list(transcript_matches(p_transcript,
-                                          p_gff,
-                                          a_gff,
-                                          know_strand,
-                                          match_middle_exons,
-                                          max_exon_length))
+        matches = select_from_matches(transcript_matches(p_transcript,
+                                                         candidates[i],
+                                                         p_gff,
+                                                         a_gff,
+                                                         know_strand,
+                                                         match_middle_exons,
+                                                         max_exon_length),
+                                      select,
+                                      max_variants)
         
         if any(matches):
 
-            utr_variants = [utr_variant(match, p_gff, i)
-                            for i, match in enumerate(matches)]
+            utr_variants = [utr_variant(match, p_gff, variant)
+                            for variant, match in matches]
             utr_variants = [v for v in utr_variants if not v is None]
             
             if any(utr_variants):
 
-                utr_variants = select_from_variants(utr_variants, select)
-                to_delete.append(matches[0]["p_transcript"])
-                all_utr_variants += utr_variants
+                to_delete.append(matches[0][1]["p_transcript"])
+                update_gene_lengths(utr_variants, p_gff)
+                for v in utr_variants:
+                    yield v["transcript"]
         else:
             utr_variants = []
             
         logging.info(f"{transcript_id:<70} {len(utr_variants)} UTR-variants")
 
-    update_gene_lengths(all_utr_variants, p_gff)
-
     if not keep:
         p_gff = delete_original_transcripts(p_gff, to_delete)
         
-    return pandas.concat([p_gff] + [v["transcript"] for v in all_utr_variants])
-
-def utr_extend_threaded(args):
+    yield p_gff
 
-    p_gff, a_gff, know_strand, match_middle_exons, keep, select, max_exon_length = args
+def utr_extend(p_gff: pandas.DataFrame,
+               a_gff: pandas.DataFrame,
+               know_strand: bool,
+               match_middle_exons: bool,
+               keep: bool,
+               select: str,
+               max_exon_length: int,
+               max_variants: int | None = None) -> pandas.DataFrame:
 
-    return utr_extend(p_gff, a_gff, know_strand, match_middle_exons, keep, select, max_exon_length)
+    frames = list(utr_extend_frames(p_gff, a_gff, know_strand, match_middle_exons, keep, select,
+                                    max_exon_length, max_variants))
+        
+    return pandas.concat(frames[-1:] + frames[:-1])
+
+def utr_extend_threaded(args) -> SpillBuffer:
+    """
+    Runs utr_extend on a shard, shard annotations may be given as spilled DataFrames.
+    Results are collected in a SpillBuffer, spilling to spill_dir beyond spill_limit.
+    """
+
+    (p_gff, a_gff, know_strand, match_middle_exons, keep, select, max_exon_length, max_variants,
+     spill_dir, spill_limit) = args
+
+    results = SpillBuffer(spill_dir, spill_limit)
+
+    for frame in utr_extend_frames(restore_frame(p_gff),
+                                   restore_frame(a_gff),
+                                   know_strand,
+                                   match_middle_exons,
+                                   keep,
+                                   select,
+                                   max_exon_length,
+                                   max_variants):
+        results.append(frame)
+
+    return results
@@ -30,6 +30,21 @@ def purely_predicted_features(transcript_match):
 
     return p_transcript.features.loc[p_transcript.features["type"] != "exon"]
 
+def variant_length(transcript_match: dict) -> int:
+    """
+    Summed exon length of the UTR-variant a transcript match would produce.
+    Computed from the exon coordinates without building the variant.
+    """
+
+    a_exons   = transcript_match["a_transcript"].exons
+    p_exons   = transcript_match["p_transcript"].exons
+    a_lengths = a_exons["end"] - a_exons["start"] + 1
+    p_lengths = p_exons["end"] - p_exons["start"] + 1
+
+    return int(a_lengths.iloc[:transcript_match["start"]+1].sum()
+               + a_lengths.iloc[transcript_match["end"]:].sum()
+               + p_lengths.iloc[1:-1].sum())
+
 def create_transcript_id(transcript_match: dict,
                          variant) -> str:
 
@@ -0,0 +1,201 @@
+"""
+Module Name:    utrpy_validation.py
+Description:    Single-pass validation of GFF3-files, to skip the AGAT preprocessing for
+                files that are already well-formatted
+                - validate_gff(file_path: str, threads=1, prediction=False) -> list[str]
+                  Checks column count, coordinates, strand, attribute format, unique IDs,
+                  resolvable single Parents and explicit transcript and exon features.
+                  Predictions are also checked for what the UTR-variant construction relies
+                  on: IDs for all features and a gene as ancestor of every transcript.
+                - is_valid_gff(file_path: str, cache_dir: str, threads=1, prediction=False) -> bool
+                  Validation results are cached by SHA-256 of the file in cache_dir
+Author:         Simon Hegele
+Date:           2026-10-19
+Version:        1.0
+License:        GPL-3
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from .utrpy_gff_utils import attributes_dict, gff_format, open_gff
+
+# Increase when the checks change, invalidates cached results
+VALIDATOR_VERSION = 3
+MAX_ERRORS        = 10
+# Levels of the GFF-hierarchy followed by get_ancestor
+MAX_ANCESTORS     = 5
+
+def is_transcript_type(feature_type: str) -> bool:
+
+    return feature_type == "transcript" or "RNA" in feature_type
+
+def reaches_gene(feature_id: str, ids: dict[str, tuple[str, str | None]],
+                 ancestors: dict[str, str | None]) -> bool:
+    """
+    Follows gene_id / Parent like get_ancestor(..., "gene") does
+    """
+
+    for _ in range(MAX_ANCESTORS):
+        if not feature_id in ids:
+            return False
+        if ids[feature_id][0] == "gene":
+            return True
+        feature_id = ancestors[feature_id]
+
+    return False
+
+def validate_gff(file_path: str, threads=1, prediction=False) -> list[str]:
+    """
+    Returns the first MAX_ERRORS errors found in the file and their total number,
+    an empty list for valid files
+    """
+
+    if gff_format(file_path) != "gff":
+        return [f"{file_path} is not a GFF3-file"]
+
+    errors      = []
+    n_errors    = 0
+    ids         = {}
+    ancestors   = {}
+    parents     = []
+    exons       = collections.Counter()
+
+    def error(n: int | None, message: str) -> None:
+        nonlocal n_errors
+        n_errors += 1
+        if n_errors <= MAX_ERRORS:
+            errors.append(message if n is None else f"Line {n}: {message}")
+
+    with open_gff(file_path, "r", threads) as gff:
+
+        for n, line in enumerate(gff, 1):
+
+            if line.startswith("##FASTA"):
+                break
+            if line.startswith("#") or not line.strip():
+                continue
+
+            fields = line.rstrip("\r\n").split("\t")
+
+            if len(fields) != 9:
+                error(n, f"{len(fields)} columns instead of 9")
+                continue
+
+            try:
+                start, end = int(fields[3]), int(fields[4])
+            except ValueError:
+                error(n, f"Coordinates {fields[3]}, {fields[4]} are not integers")
+                continue
+
+            if not 1 <= start <= end:
+                error(n, f"Invalid coordinates {start}-{end}")
+            if not fields[6] in ["+", "-", ".", "?"]:
+                error(n, f"Invalid strand {fields[6]}")
+
+            try:
+                attributes = attributes_dict({"attributes": fields[8]})
+            except IndexError:
+                error(n, f"Attributes are not key=value pairs: {fields[8]}")
+                continue
+
+            feature_type = fields[2]
+            feature_id   = attributes.get("ID")
+            parent       = attributes.get("Parent")
+
+            if feature_id is None:
+                if is_transcript_type(feature_type) or prediction:
+                    error(n, f"{feature_type} without ID")
+            elif feature_id in ids:
+                # Lines of discontinuous features (e.g. CDS) share their ID
+                if (ids[feature_id] != (feature_type, parent) or
+                    is_transcript_type(feature_type) or feature_type == "gene"):
+                    error(n, f"Duplicate ID {feature_id}")
+            else:
+                ids[feature_id]       = (feature_type, parent)
+                ancestors[feature_id] = attributes.get("gene_id", parent)
+
+            # Transcript features are found by comparing Parent with the transcript ID,
+            # features with multiple Parents would be dropped silently
+            if parent is not None:
+                parents += [(n, p) for p in parent.split(",")]
+                if "," in parent:
+                    error(n, f"{feature_type} with multiple Parents {parent}")
+            if feature_type == "exon":
+                if parent is None:
+                    error(n, "exon without Parent")
+                elif not "," in parent:
+                    exons.update([(n, parent)])
+
+    for n, parent in parents:
+        if not parent in ids:
+            error(n, f"Parent {parent} does not exist")
+
+    # In order of the file, for reproducible error messages
+    transcripts = [i for i, (feature_type, _) in ids.items() if is_transcript_type(feature_type)]
+
+    for n, parent in exons:
+        if parent in ids and not is_transcript_type(ids[parent][0]):
+            error(n, f"Parent {parent} of exon is no transcript")
+
+    with_exons = {parent for _, parent in exons}
+
+    for transcript in transcripts:
+        if not transcript in with_exons:
+            error(None, f"Transcript {transcript} has no exons")
+    if not transcripts:
+        error(None, "No transcript features")
+    if prediction:
+        for transcript in transcripts:
+            if not reaches_gene(transcript, ids, ancestors):
+                error(None, f"Transcript {transcript} has no gene as ancestor")
+
+    if n_errors > MAX_ERRORS:
+        errors.append(f"{n_errors - MAX_ERRORS} more errors")
+
+    return errors
+
+def file_hash(file_path: str) -> str:
+
+    digest = hashlib.sha256()
+
+    with open(file_path, "rb") as file:
+        while chunk := file.read(1 << 20):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def is_valid_gff(file_path: str, cache_dir: str, threads=1, prediction=False) -> bool:
+    """
+    Validates a file unless a cached result for its content exists.
+    One JSON-file per file hash (and role), so concurrent runs don't conflict.
+    """
+
+    role       = "prediction" if prediction else "assembly"
+    cache_path = os.path.join(cache_dir, f"{file_hash(file_path)}.{role}.json")
+    cached     = None
+
+    if os.path.isfile(cache_path):
+        with open(cache_path) as cache_file:
+            cached = json.load(cache_file)
+
+    if cached is not None and cached["version"] == VALIDATOR_VERSION:
+        logging.info(f"Using cached validation of {file_path}")
+        errors = cached["errors"]
+    else:
+        logging.info(f"Validating {file_path}")
+        errors = validate_gff(file_path, threads, prediction)
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=cache_dir, delete=False) as cache_file:
+            json.dump({"version": VALIDATOR_VERSION, "file": file_path, "errors": errors},
+                      cache_file)
+        os.replace(cache_file.name, cache_path)
+
+    for e in errors:
+        logging.info(f"{file_path}: {e}")
+
+    return not errors